@@ -0,0 +1,52 @@
+import numpy as np
+from graph_tool import Graph
+from random_steiner_tree.util import from_gt
+
+from graph_helpers import remove_filters, get_edge_weights
+from observation_state import ObservationState
+
+
+class ActiveSubgraph():
+    """
+    the visible part of `g` re-indexed into a dense, smaller graph
+
+    - `n2o`: new node id -> original node id
+    - `o2n`: original node id -> new node id (-1 if not in the subgraph)
+    - `g`: the dense graph (GraphView with all filters on)
+    - `gi`: the random_steiner_tree graph built on `g`
+
+    uninfected observations made after the compaction should be forwarded
+    via `observe_uninfected_node` (using original ids)
+    """
+    def __init__(self, g):
+        vfilt = g.get_vertex_filter()[0]
+        n_total = g.num_vertices(ignore_filter=True)
+        if vfilt is None:
+            self.n2o = np.arange(n_total)
+        else:
+            self.n2o = np.nonzero(vfilt.a)[0]
+        self.o2n = np.full(n_total, -1, dtype=np.int64)
+        self.o2n[self.n2o] = np.arange(len(self.n2o))
+
+        # pruned copy keeps the relative vertex order and the edge properties
+        self.g = remove_filters(Graph(g, prune=True))
+        self.gi = from_gt(self.g, weights=get_edge_weights(self.g))
+        self.state = ObservationState(self.g, self.gi)
+
+    @property
+    def num_nodes(self):
+        return len(self.n2o)
+
+    def to_new(self, nodes):
+        return self.o2n[np.asarray(nodes, dtype=np.int64)]
+
+    def to_old(self, nodes):
+        return self.n2o[np.asarray(nodes, dtype=np.int64)]
+
+    def observe_uninfected_node(self, n, obs):
+        """`n` and `obs` use original ids"""
+        if self.o2n[n] < 0:
+            return  # not in the subgraph already
+        self.state.observe_uninfected_node(
+            int(self.o2n[n]), self.to_new(list(obs))
+        )
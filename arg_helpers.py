@@ -29,6 +29,8 @@ def add_query_method_args(parser):
     # following applies to sampler approach
     parser.add_argument('-n', '--n_queries', default=10, type=int,
                         help='number of queries')
+    parser.add_argument('--batch_size', default=1, type=int,
+                        help='number of nodes queried per round')
     parser.add_argument('-m', '--query_sampling_method', default='loop_erased', type=str,
                         choices=('loop_erased', 'cut') + SIMULATION_METHODS,
                         help='the steiner tree sampling method')
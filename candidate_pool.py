@@ -0,0 +1,69 @@
+import random
+import numpy as np
+
+
+class CandidatePool():
+    """
+    set of candidate query nodes, backed by arrays
+
+    - `_nodes[:len(self)]`: the candidates (in no particular order)
+    - `_pos[n]`: position of `n` in `_nodes`, -1 if `n` is not a candidate
+
+    removal swaps the node with the last one, so it's O(1),
+    intersection with a node mask (e.g., the vertex filter) is vectorized
+    """
+    def __init__(self, mask):
+        """mask: boolean array over all node ids, True for candidates"""
+        mask = np.asarray(mask, dtype=bool)
+        self._pos = np.full(len(mask), -1, dtype=np.int64)
+        self._set_nodes(np.nonzero(mask)[0])
+
+    def _set_nodes(self, nodes):
+        self._pos[:] = -1
+        self._nodes = nodes.astype(np.int64)
+        self._size = len(nodes)
+        self._pos[self._nodes] = np.arange(self._size)
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        return iter(self._nodes[:self._size].tolist())
+
+    def __contains__(self, n):
+        return self._pos[n] >= 0
+
+    @property
+    def nodes(self):
+        """np.ndarray of candidates"""
+        return self._nodes[:self._size]
+
+    @property
+    def mask(self):
+        """boolean array over all node ids"""
+        return self._pos >= 0
+
+    def remove(self, n):
+        i = self._pos[n]
+        if i < 0:
+            raise KeyError(n)
+        last = self._nodes[self._size - 1]
+        self._nodes[i] = last
+        self._pos[last] = i
+        self._pos[n] = -1
+        self._size -= 1
+
+    def intersect(self, mask):
+        """keep only candidates `n` with mask[n] being True"""
+        nodes = self.nodes
+        self._set_nodes(nodes[np.asarray(mask, dtype=bool)[nodes]])
+
+    def keep_only(self, nodes):
+        """keep only candidates in `nodes`"""
+        mask = np.zeros(len(self._pos), dtype=bool)
+        mask[np.asarray(list(nodes), dtype=np.int64)] = True
+        self.intersect(mask)
+
+    def random_choice(self):
+        # `random`, not `np.random`, so that `random.seed` controls the query order
+        return int(self._nodes[random.randrange(self._size)])
@@ -1,29 +1,22 @@
 # coding: utf-8
 
-import networkx as nx
 import numpy as np
 import random
-import pandas as pd
-from scipy.spatial.distance import cosine, cdist
-from tqdm import tqdm
-from joblib import Parallel, delayed
-from collections import Counter, OrderedDict
-from random_steiner_tree import random_steiner_tree
+from collections import OrderedDict
 from random_steiner_tree.util import from_nx
 
-from graph_helpers import swap_end_points
-from proba_helpers import casccade_probability_nx, tree_probability_nx, sampled_tree_freqs
+from distribution_sweep import sweep, add_sweep_args, KEY_COLUMNS
 
+from proba_helpers import (
+    casccade_probability_nx,
+    tree_probability_nx,
+    streaming_tree_freqs,
+    distribution_distances
+)
 
-def l1_dist(probas1, probas2):
-    return cdist([probas1],
-                 [probas2],
-                 'minkowski', p=1.0)[0, 0]
-
-
-def one_run(num_vertices, num_terminals, n_samples, sampling_method, low, high):
-    g = nx.complete_graph(num_vertices, create_using=nx.DiGraph())
 
+def one_run(g, num_terminals, n_samples, sampling_method, low, high):
+    """g: complete nx.DiGraph, whose edge weights are re-drawn"""
     for u, v in g.edges_iter():
         g[u][v]['weight'] = (high - low) * np.random.random() + low
 
@@ -42,54 +35,44 @@ def one_run(num_vertices, num_terminals, n_samples, sampling_method, low, high):
             g_rev[u][v]['weight'], g_rev[v][u]['weight'] = g_rev[v][u]['weight'], g_rev[u][v]['weight']
     gi_rev = from_nx(g_rev)
 
-    tree_freq_rev = sampled_tree_freqs(gi_rev, X, root, sampling_method, n_samples)
-    possible_trees = list(tree_freq_rev.keys())
+    n = g.number_of_nodes()
+    tree_freq_rev = streaming_tree_freqs(gi_rev, X, root, sampling_method, n_samples, n)
 
-    tree_probas_rev = np.array([tree_freq_rev[t] for t in possible_trees]) / n_samples
-    cascade_probas = np.array([casccade_probability_nx(g_rev, t) for t in possible_trees])
-    cascade_probas /= cascade_probas.sum()
+    def cascade_proba(t):
+        return casccade_probability_nx(g_rev, t)
+
+    def tree_proba(t):
+        return tree_probability_nx(g_rev, t)
 
     # distance without re-sampling
-    cos_sim_rev_only = 1 - cosine(tree_probas_rev, cascade_probas)
-    l1_dist_rev_only = l1_dist(tree_probas_rev, cascade_probas)
+    dists_rev_only = tree_freq_rev.distances_to(cascade_proba)
 
     # now we do the re-sampling
-    trees = [swap_end_points(random_steiner_tree(gi_rev, X, root, method=sampling_method))
-             for i in range(n_samples)]
-    possible_trees = list(set(trees))
-
-    # caching table
-    p_tbl = {t: casccade_probability_nx(g_rev, t) for t in possible_trees}
-    pi_tbl = {t: tree_probability_nx(g_rev, t) for t in possible_trees}
+    tree_freq = streaming_tree_freqs(gi_rev, X, root, sampling_method, n_samples, n)
 
-    p_T = np.array([p_tbl.get(t, 0) for t in trees])
-    pi_T = np.array([pi_tbl.get(t, 0) for t in trees])
-    sampling_weights = p_T / pi_T
+    # trees are re-sampled with replacement, with weights p / pi,
+    # which amounts to a multinomial over the unique trees
+    p_T = tree_freq.evaluate(cascade_proba)
+    pi_T = tree_freq.evaluate(tree_proba)
+    sampling_weights = tree_freq.counts * p_T / pi_T
 
     sampling_weights /= sampling_weights.sum()  # normlization
 
-    # re-sampling trees by weights
-    resampled_tree_idx = np.random.choice(n_samples, p=sampling_weights,
-                                          replace=True, size=n_samples)
-
-    resampled_trees = [trees[i] for i in resampled_tree_idx]
-
-    resampled_tree_freq = Counter(resampled_trees)
-    resampled_tree_probas = np.array([resampled_tree_freq[t] for t in possible_trees]) / n_samples
+    resampled_tree_probas = np.random.multinomial(n_samples, sampling_weights) / n_samples
 
     # here we calculate the probas based on g_rev
     # because edges point towards root
-    cascade_probas = np.array([casccade_probability_nx(g_rev, t) for t in possible_trees])
-    cascade_probas /= cascade_probas.sum()
+    cascade_probas = p_T / p_T.sum()
+
+    dists_together = distribution_distances(resampled_tree_probas, cascade_probas)
 
-    cos_sim_together = 1 - cosine(resampled_tree_probas, cascade_probas)
-    l1_dist_together = l1_dist(resampled_tree_probas,
-                               cascade_probas)
     ans = OrderedDict()
-    ans['cos_sim_without_resampling'] = cos_sim_rev_only
-    ans['l1_dist_without_resampling'] = l1_dist_rev_only
-    ans['cos_sim_with_resampling'] = cos_sim_together
-    ans['l1_dist_with_resampling'] = l1_dist_together
+    ans['cos_sim_without_resampling'] = dists_rev_only['cosine_sim']
+    ans['l1_dist_without_resampling'] = dists_rev_only['l1_dist']
+    ans['hellinger_dist_without_resampling'] = dists_rev_only['hellinger_dist']
+    ans['cos_sim_with_resampling'] = dists_together['cosine_sim']
+    ans['l1_dist_with_resampling'] = dists_together['l1_dist']
+    ans['hellinger_dist_with_resampling'] = dists_together['hellinger_dist']
 
     return ans
 
@@ -97,20 +80,7 @@ def one_run(num_vertices, num_terminals, n_samples, sampling_method, low, high):
 if __name__ == '__main__':
     import argparse
     parser = argparse.ArgumentParser(description='')
-    parser.add_argument('-n', '--num_vertices',
-                        type=int,
-                        help='num of vertices of the complete graph')
-    parser.add_argument('-x', '--num_terminals',
-                        type=int, default=2,
-                        help='num  of terminals of the complete graph')
-    parser.add_argument('-k', '--n_samples',
-                        type=int, default=10000000,
-                        help='num  of steiner tree samples')
-    parser.add_argument('-r', '--n_runs',
-                        type=int, default=48,
-                        help='num of runs')
-    parser.add_argument('-o', '--output',
-                        help='output path')
+    add_sweep_args(parser)
 
     args = parser.parse_args()
 
@@ -122,15 +92,10 @@ if __name__ == '__main__':
     high = 1
     low = 0.0
     sampling_method = 'loop_erased'
-    num_vertices = args.num_vertices
-    num_terminals = args.num_terminals
-    n_samples = args.n_samples
-
-    n_runs = args.n_runs
 
-    recs = Parallel(n_jobs=4)(
-        delayed(one_run)(num_vertices, num_terminals, n_samples, sampling_method,
-                         low, high) for i in tqdm(range(n_runs), total=n_runs))
-    df = pd.DataFrame.from_records(recs)
+    df = sweep(one_run, args.num_vertices, args.num_terminals, args.n_samples,
+               args.n_runs, args.output,
+               n_jobs=args.n_jobs, base_seed=args.seed,
+               sampling_method=sampling_method, low=low, high=high)
 
-    df.describe().to_pickle(args.output)
+    print(df.groupby(KEY_COLUMNS[:-1]).describe())
@@ -59,7 +59,7 @@ def ic(g, p, source=None, infected=None, min_fraction=0.0, max_fraction=0.5, **k
     """
     IC cascade generator that filters out small cascades (under min_fraction)
     """
-    N = g.num_vertices()
+    N = g.num_vertices(ignore_filter=True)
     while True:
         source, times, tree = ic_opt(
             g, p=p,
@@ -1,9 +1,9 @@
 import random
-from scipy.stats import entropy
+import numpy as np
 from tqdm import tqdm
 
 from graph_helpers import (
-    extract_nodes,
+    visible_mask,
     extract_steiner_tree,
     gen_random_spanning_tree,
     filter_graph_by_edges,
@@ -24,6 +24,33 @@ from minimum_steiner_tree import min_steiner_tree
 
 SIMULATION_METHODS = ('naive', 'mst', 'rst', 'rrs')
 
+def node_uncertainty(
+        g, obs,
+        sampler,
+        error_estimator
+):
+    """
+    entropy of the infection probability of every node, based on sampled steiner trees
+
+    Args:
+
+    Graph `g`
+    list of int `obs`: list of observed nodes
+    sampler: the tree sampler
+    error_estimator: what does the actual counting
+
+    Returns:
+
+    np.ndarray of float, indexed by node id (hidden nodes included)
+    """
+    if sampler.is_empty:
+        sampler.fill(obs)
+
+    # builds the matrix if needed
+    infection_probability(g, obs, sampler, error_estimator)
+    return error_estimator.node_level_entropy()
+
+
 def uncertainty_scores(
         g, obs,
         sampler,
@@ -44,17 +71,13 @@ def uncertainty_scores(
 
     dict of (int, float): node to uncertainty score
     """
-    if sampler.is_empty:
-        sampler.fill(obs)
-
-    p = infection_probability(g, obs, sampler, error_estimator)
-    non_obs_nodes = set(extract_nodes(g)) - set(obs)
+    uncert = node_uncertainty(g, obs, sampler, error_estimator)
 
-    uncert = [entropy([v, 1-v]) for v in p]
+    non_obs = visible_mask(g)
+    non_obs[np.asarray(obs, dtype=np.int64)] = False
+    non_obs_nodes = np.nonzero(non_obs)[0]
 
-    r = {n: uncert[n]
-         for n in non_obs_nodes}
-    return r
+    return dict(zip(non_obs_nodes.tolist(), uncert[non_obs_nodes].tolist()))
 
 
 def sample_steiner_trees(g, obs,
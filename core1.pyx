@@ -1,70 +1,182 @@
 # cython: linetrace=True
 
+# trees are packed into a node-by-tree bitset:
+# bit j of row i is set if the i-th node is in the j-th tree,
+# so filtering trees is bitwise AND/ANDNOT and counting is popcount
+
 import numpy as np
-from libc.math cimport log
+cimport cython
+from cython.parallel import prange
+from libc.math cimport log, fabs
+from libc.stdint cimport uint64_t
+
+cdef extern from *:
+    int popcount "__builtin_popcountll" (unsigned long long) nogil
 
 cdef double EPS = 1e-8
 
-cdef bint close_to_zero_or_one(double v):
-    return (abs(v) < EPS) or (abs(1.0 - v) < EPS)
+cdef inline bint close_to_zero_or_one(double v) noexcept nogil:
+    return (fabs(v) < EPS) or (fabs(1.0 - v) < EPS)
 
 # cdef bint close_to_one(double v):
 #     return abs(1.0 - v) < EPS
 
+
+def pack_trees(T, nodes):
+    """
+    T: list of set of ints, list of trees represented by nodes
+    nodes: list of ints
+
+    Returns:
+
+    np.ndarray of uint64, |nodes| x ceil(|T| / 64),
+    bit j of row i is set if nodes[i] is in T[j]
+    """
+    nodes = list(nodes)
+    cdef Py_ssize_t i, j, n_trees = len(T), n_nodes = len(nodes)
+    cdef long n, max_node
+    cdef uint64_t bit
+
+    bits = np.zeros((n_nodes, (n_trees + 63) // 64), dtype=np.uint64)
+    cdef uint64_t[:, ::1] b = bits
+    if n_nodes == 0 or n_trees == 0:
+        return bits
+
+    if n_nodes * n_trees <= sum(len(t) for t in T):
+        # few nodes: membership tests
+        for j in range(n_trees):
+            t = T[j]
+            bit = (<uint64_t>1) << (j & 63)
+            for i in range(n_nodes):
+                if nodes[i] in t:
+                    b[i, j >> 6] |= bit
+    else:
+        # many nodes: scan the trees
+        uniq, inverse = np.unique(np.asarray(nodes, dtype=np.int64), return_inverse=True)
+        if len(uniq) < n_nodes:
+            # duplicate nodes share the same row
+            return np.ascontiguousarray(pack_trees(T, uniq.tolist())[inverse.ravel()])
+
+        max_node = uniq[-1]
+        row_of_arr = np.full(max_node + 1, -1, dtype=np.int64)
+        row_of_arr[np.asarray(nodes, dtype=np.int64)] = np.arange(n_nodes)
+        row_of = row_of_arr.tolist()
+        for j in range(n_trees):
+            bit = (<uint64_t>1) << (j & 63)
+            for n in T[j]:
+                if 0 <= n <= max_node and row_of[n] >= 0:
+                    b[row_of[n], j >> 6] |= bit
+    return bits
+
+
+cdef all_trees_mask(Py_ssize_t n_trees):
+    mask = np.full((n_trees + 63) // 64, np.iinfo(np.uint64).max, dtype=np.uint64)
+    if n_trees % 64 > 0:
+        mask[-1] = ((<uint64_t>1) << (n_trees & 63)) - 1
+    return mask
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef void filter_mask(uint64_t[::1] mask, const uint64_t[::1] row, int value) noexcept nogil:
+    """keep trees in `mask` that contain the node (value 1) or do not (otherwise)"""
+    cdef Py_ssize_t w
+    if value == 1:
+        for w in range(mask.shape[0]):
+            mask[w] &= row[w]
+    else:
+        for w in range(mask.shape[0]):
+            mask[w] &= ~row[w]
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef long count_mask(const uint64_t[::1] mask) noexcept nogil:
+    cdef Py_ssize_t w
+    cdef long cnt = 0
+    for w in range(mask.shape[0]):
+        cnt += popcount(mask[w])
+    return cnt
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef double sum_entropy(const uint64_t[:, ::1] rows, const uint64_t[::1] mask, double N) noexcept nogil:
+    """sum of the entropy of each node in `rows`, over the `N` trees in `mask`"""
+    cdef Py_ssize_t i, w
+    cdef long cnt
+    cdef double p, ent, error = 0.0
+    for i in prange(rows.shape[0], schedule='static'):
+        cnt = 0
+        for w in range(mask.shape[0]):
+            cnt = cnt + popcount(rows[i, w] & mask[w])
+        p = (N - cnt) / N  # proba of being uninfected
+        ent = 0.0
+        if not close_to_zero_or_one(p):
+            ent = -(p * log(p) + (1-p) * log(1-p))
+        error += ent
+    return error
+
+
+cdef selected_trees(T, const uint64_t[::1] mask):
+    cdef Py_ssize_t j
+    return [T[j] for j in range(len(T))
+            if (mask[j >> 6] >> (j & 63)) & 1]
+
+
 cpdef matching_trees_cython(T, int node, int value):
     """
     T: list of set of ints, list of trees represented by nodes
     node: node to filter
     value: value to filter
     """
-    if value == 1:  # infected
-        return [t for t in T if node in t]
-    else:  # uninfected
-        return [t for t in T if (node not in t)]
+    bits = pack_trees(T, [node])
+    mask = all_trees_mask(len(T))
+    filter_mask(mask, bits[0], value)
+    return selected_trees(T, mask)
+
 
 def matching_trees(T, node_values):
     """
     T: list of set of ints, list of trees represented by nodes
-    node: node to filter
-    value: value to filter
+    node_values: dict of node -> value (1 for infected, otherwise uninfected) to filter
     """
-    def predicate(t):
-        for n, v in node_values.items():
-            if v == 1:
-                if n not in t:
-                    return False
-            else:
-                if n in t:
-                    return False
-        return True
-    return [t for t in T if predicate(t)]
-
-    # if value == 1:  # infected
-    #     return [t for t in T if node in t]
-    # else:  # uninfected
-    #     return [t for t in T if node not in t]
+    nodes = list(node_values.keys())
+    bits = pack_trees(T, nodes)
+    mask = all_trees_mask(len(T))
+    cdef Py_ssize_t i
+    for i in range(len(nodes)):
+        filter_mask(mask, bits[i], 1 if node_values[nodes[i]] == 1 else 0)
+    return selected_trees(T, mask)
 
-# @profile
-cpdef prediction_error(int q, int y_hat, T, hidden_nodes):
-    # filter T by (q, y_hat)
-    sub_T = matching_trees_cython(T, q, y_hat)
-    cdef double p, error = 0.0, N = len(sub_T)
 
+cdef double _prediction_error(const uint64_t[:, ::1] bits, uint64_t[::1] mask, int y_hat):
+    """bits: row 0 is the query node, the others are hidden nodes
+
+    `mask` is filtered by (query, y_hat) in place"""
+    filter_mask(mask, bits[0], y_hat)
+    cdef double N = count_mask(mask)
     if N > 0:  # avoid ZeroDivisionError
-        for u in hidden_nodes:
-            p = len(matching_trees_cython(sub_T, u, 0)) / N
-            if not close_to_zero_or_one(p):
-                error -= (p * log(p) + (1-p) * log(1-p))
-    return error
+        return sum_entropy(bits[1:], mask, N)
+    return 0.0
+
+
+# @profile
+cpdef prediction_error(int q, int y_hat, T, hidden_nodes):
+    bits = pack_trees(T, [q] + list(hidden_nodes))
+    return _prediction_error(bits, all_trees_mask(len(T)), y_hat)
 
 # @profile
 def query_score(int q, T, hidden_nodes):
     assert q not in hidden_nodes
+    # pack once for both labels
+    bits = pack_trees(T, [q] + list(hidden_nodes))
     cdef double p, score = 0
     cdef int y_hat
     for y_hat in [0, 1]:
-        p = <double>len(matching_trees_cython(T, q, y_hat)) / len(T)
-        error = prediction_error(q, y_hat, T, hidden_nodes)
-        score += p * prediction_error(q, y_hat, T, hidden_nodes)
+        mask = all_trees_mask(len(T))
+        error = _prediction_error(bits, mask, y_hat)
+        p = <double>count_mask(mask) / len(T)
+        score += p * error
 
     return score
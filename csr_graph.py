@@ -0,0 +1,187 @@
+import os
+import shutil
+import pickle as pkl
+import numpy as np
+
+from graph_tool import Graph
+from graph_tool.generation import lattice
+
+from graph_helpers import (
+    graph_path,
+    load_graph_by_name,
+    remove_filters,
+    edge_array,
+    get_edge_weights
+)
+
+CSR_FILES = ('indptr', 'indices', 'edge_ids', 'weights')
+
+
+class CSRGraph():
+    """
+    a graph in compressed sparse row (CSR) format, backed by numpy arrays
+
+    - indptr: (N+1, ), out-neighbours of `v` are indices[indptr[v]:indptr[v+1]]
+    - indices: (M, ), target nodes, sorted within each row
+    - edge_ids: (M, ), edge index of each entry in the graph_tool graph (see `gt`)
+    - weights: (M, ), edge weights, None if unweighted
+
+    for undirected graphs, each edge appears twice (once per end point)
+    and both entries share the same edge id
+
+    the graph_tool graph is built only when `gt` is accessed
+    """
+    def __init__(self, indptr, indices, edge_ids, weights=None, directed=True):
+        self.indptr = indptr
+        self.indices = indices
+        self.edge_ids = edge_ids
+        self.weights = weights
+        self.directed = directed
+        self._gt = None
+
+    @classmethod
+    def from_gt(cls, g, weights=None):
+        """build from a graph_tool graph (only visible edges are considered)
+
+        the edge ids refer to the graph returned by `gt`, not to `g`
+        """
+        n = g.num_vertices(ignore_filter=True)
+        edges = edge_array(g)
+        src, tgt = edges[:, 0], edges[:, 1]
+        ids = np.arange(len(edges))
+        if weights is not None:
+            w = weights.a[edges[:, 2]]
+        else:
+            w = None
+
+        directed = g.is_directed()
+        if not directed:
+            # add the reverse entries, except for self-loops
+            mask = (src != tgt)
+            src, tgt = np.concatenate((src, tgt[mask])), np.concatenate((tgt, src[mask]))
+            ids = np.concatenate((ids, ids[mask]))
+            if w is not None:
+                w = np.concatenate((w, w[mask]))
+
+        order = np.lexsort((tgt, src))
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+
+        return cls(indptr, tgt[order], ids[order],
+                   (w[order] if w is not None else None),
+                   directed=directed)
+
+    @classmethod
+    def load(cls, dirname, mmap_mode='r'):
+        """load from `dirname`, arrays are memory-mapped by default
+        so that they are shared by processes on the same machine
+        """
+        meta = pkl.load(open(os.path.join(dirname, 'meta.pkl'), 'rb'))
+        arrays = {}
+        for name in CSR_FILES:
+            path = os.path.join(dirname, name + '.npy')
+            if os.path.exists(path):
+                arrays[name] = np.load(path, mmap_mode=mmap_mode)
+            else:
+                arrays[name] = None
+        return cls(directed=meta['directed'], **arrays)
+
+    def save(self, dirname):
+        """save to `dirname`
+
+        files are written to a temporary directory first and then renamed,
+        so concurrent jobs never see a partially written cache
+        """
+        tmp_dirname = '{}.tmp{}'.format(dirname.rstrip('/'), os.getpid())
+        os.makedirs(tmp_dirname)
+        for name in CSR_FILES:
+            arr = getattr(self, name)
+            if arr is not None:
+                np.save(os.path.join(tmp_dirname, name + '.npy'), arr)
+        pkl.dump({'directed': self.directed},
+                 open(os.path.join(tmp_dirname, 'meta.pkl'), 'wb'))
+        try:
+            os.rename(tmp_dirname, dirname)
+        except OSError:
+            # some other process finished it first
+            shutil.rmtree(tmp_dirname)
+
+    def num_vertices(self):
+        return len(self.indptr) - 1
+
+    def num_edges(self):
+        if self.directed:
+            return len(self.indices)
+        else:
+            return int(self.edge_ids.max()) + 1 if len(self.edge_ids) > 0 else 0
+
+    def out_degree(self):
+        return np.diff(self.indptr)
+
+    def sources(self):
+        """source node of each entry"""
+        return np.repeat(np.arange(self.num_vertices()), self.out_degree())
+
+    def out_neighbours(self, v):
+        return self.indices[self.indptr[v]:self.indptr[v+1]]
+
+    def unique_edges(self):
+        """
+        returns (source, target, weights) of each edge, ordered by edge id
+        """
+        src = self.sources()
+        if self.directed:
+            mask = np.ones(len(src), dtype=bool)
+        else:
+            mask = (src <= self.indices)
+
+        m = self.num_edges()
+        ids = self.edge_ids[mask]
+        e_src, e_tgt = np.empty(m, dtype=np.int64), np.empty(m, dtype=np.int64)
+        e_src[ids], e_tgt[ids] = src[mask], self.indices[mask]
+        if self.weights is not None:
+            e_w = np.empty(m, dtype=np.float64)
+            e_w[ids] = self.weights[mask]
+        else:
+            e_w = None
+        return e_src, e_tgt, e_w
+
+    @property
+    def gt(self):
+        """the graph_tool graph (with all-on filters, as `load_graph_by_name`),
+
+        built on first access, edge index i corresponds to edge id i
+        """
+        if self._gt is None:
+            src, tgt, w = self.unique_edges()
+            g = Graph(directed=self.directed)
+            g.add_vertex(self.num_vertices())
+            g.add_edge_list(np.column_stack((src, tgt)))
+            if w is not None:
+                weights = g.new_edge_property('float')
+                weights.a = w
+                g.edge_properties['weights'] = weights
+            self._gt = remove_filters(g)
+        return self._gt
+
+
+def csr_cache_path(name, weighted=False, suffix=''):
+    return os.path.splitext(graph_path(name, weighted, suffix))[0] + '.csr'
+
+
+def load_csr_graph_by_name(name, weighted=False, suffix='', mmap_mode='r'):
+    """
+    load the graph in CSR format,
+    the cache is created from the `.gt` file if it does not exist yet
+    """
+    if name == 'lattice':
+        g = lattice((10, 10))
+        return CSRGraph.from_gt(g, get_edge_weights(g))
+
+    path = csr_cache_path(name, weighted, suffix)
+    if not os.path.exists(path):
+        g = load_graph_by_name(name, weighted, suffix)
+        CSRGraph.from_gt(g, get_edge_weights(g)).save(path)
+        print('csr cache dumped to {}'.format(path))
+    print('load csr graph from {}'.format(path))
+    return CSRGraph.load(path, mmap_mode=mmap_mode)
@@ -0,0 +1,149 @@
+"""
+parameter sweep harness for the tree/cascade distribution experiments
+
+- the complete graph of each size is built once (edge weights are re-drawn by each run)
+- runs are fanned out to a process pool, each with its own seed derived from its grid cell,
+  so results do not depend on scheduling
+- results are streamed to a directory of parquet files as runs complete
+- finished (cell, run) pairs are skipped on restart
+"""
+import os
+import random
+import numpy as np
+import pandas as pd
+import networkx as nx
+
+from glob import glob
+from itertools import product
+from multiprocessing import Pool
+from tqdm import tqdm
+
+
+KEY_COLUMNS = ['num_vertices', 'num_terminals', 'n_samples', 'run']
+
+_worker = {}
+
+
+def run_seed(base_seed, key):
+    """seed of the run identified by `key` (a tuple of ints)"""
+    return int(np.random.SeedSequence([base_seed] + list(key)).generate_state(1)[0])
+
+
+class ColumnarResultStore():
+    """
+    results as a directory of parquet files, one per flush
+
+    each file is written to a temporary path then renamed,
+    so an interrupted run leaves no partial file behind
+    """
+    def __init__(self, dirname, flush_every=16):
+        self.dirname = dirname
+        self.flush_every = flush_every
+        os.makedirs(dirname, exist_ok=True)
+        self._buffer = []
+        self._n_parts = len(self._parts())
+
+    def _parts(self):
+        return sorted(glob(os.path.join(self.dirname, 'part-*.parquet')))
+
+    def load(self):
+        parts = self._parts()
+        if len(parts) == 0:
+            return pd.DataFrame(columns=KEY_COLUMNS)
+        return pd.concat([pd.read_parquet(p) for p in parts], ignore_index=True)
+
+    def finished_keys(self):
+        df = self.load()
+        return set(map(tuple, df[KEY_COLUMNS].values.astype(int).tolist()))
+
+    def append(self, record):
+        self._buffer.append(record)
+        if len(self._buffer) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if len(self._buffer) == 0:
+            return
+        path = os.path.join(self.dirname, 'part-{:05d}.parquet'.format(self._n_parts))
+        pd.DataFrame.from_records(self._buffer).to_parquet(path + '.tmp')
+        os.replace(path + '.tmp', path)
+        self._n_parts += 1
+        self._buffer = []
+
+
+def init_worker(graphs):
+    """graphs: num_vertices -> complete graph"""
+    from graph_tool import openmp_set_num_threads
+    openmp_set_num_threads(1)
+    _worker['graphs'] = graphs
+
+
+def run_one_cell(args):
+    one_run, key, seed, run_kwargs = args
+    num_vertices, num_terminals, n_samples, _ = key
+
+    random.seed(seed)
+    np.random.seed(seed)
+
+    record = one_run(_worker['graphs'][num_vertices], num_terminals, n_samples, **run_kwargs)
+    record.update(zip(KEY_COLUMNS, key))
+    record['seed'] = seed
+    return record
+
+
+def sweep(one_run, graph_sizes, terminal_sizes, sample_sizes, n_runs, output_dir,
+          n_jobs=4, base_seed=42, flush_every=16, **run_kwargs):
+    """
+    run `one_run(g, num_terminals, n_samples, **run_kwargs)` over the grid,
+    `n_runs` times per grid cell
+
+    one_run: module level function returning a flat dict of scalars,
+        `g` being a complete nx.DiGraph shared by the runs of the same graph size,
+        whose edge weights should be assigned by `one_run`
+
+    Returns:
+
+    pd.DataFrame of all results so far (including those of previous sweeps)
+    """
+    store = ColumnarResultStore(output_dir, flush_every=flush_every)
+    finished = store.finished_keys()
+
+    keys = [key
+            for key in product(graph_sizes, terminal_sizes, sample_sizes, range(n_runs))
+            if key not in finished]
+    print('{} runs finished, {} to go'.format(len(finished), len(keys)))
+
+    graphs = {n: nx.complete_graph(n, create_using=nx.DiGraph())
+              for n in graph_sizes}
+    tasks = [(one_run, key, run_seed(base_seed, key), run_kwargs) for key in keys]
+
+    with Pool(processes=n_jobs, initializer=init_worker, initargs=(graphs, )) as pool:
+        try:
+            for record in tqdm(pool.imap_unordered(run_one_cell, tasks), total=len(tasks)):
+                store.append(record)
+        finally:
+            store.flush()
+    return store.load()
+
+
+def add_sweep_args(parser):
+    parser.add_argument('-n', '--num_vertices',
+                        type=int, nargs='+',
+                        help='num of vertices of the complete graph')
+    parser.add_argument('-x', '--num_terminals',
+                        type=int, nargs='+', default=[2],
+                        help='num  of terminals of the complete graph')
+    parser.add_argument('-k', '--n_samples',
+                        type=int, nargs='+', default=[10000000],
+                        help='num  of steiner tree samples')
+    parser.add_argument('-r', '--n_runs',
+                        type=int, default=48,
+                        help='num of runs per grid cell')
+    parser.add_argument('-j', '--n_jobs',
+                        type=int, default=4,
+                        help='number of worker processes')
+    parser.add_argument('--seed',
+                        type=int, default=42,
+                        help='base seed, from which the seed of each run is derived')
+    parser.add_argument('-o', '--output',
+                        help='output directory (finished runs in it are skipped)')
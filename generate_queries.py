@@ -4,6 +4,9 @@ import time
 import pickle as pkl
 import os
 import argparse
+import multiprocessing
+
+from glob import glob
 
 from tqdm import tqdm
 from graph_tool import openmp_set_num_threads
@@ -16,6 +19,7 @@ from query_selection import (RandomQueryGenerator, EntropyQueryGenerator,
 from simulator import Simulator
 from joblib import Parallel, delayed
 from graph_helpers import remove_filters, load_graph_by_name, get_edge_weights
+from csr_graph import load_csr_graph_by_name
 from helpers import load_cascades, cascade_source, timeout
 from sample_pool import TreeSamplePool, SimulatedCascadePool
 from random_steiner_tree.util import from_gt
@@ -47,6 +51,8 @@ parser.add_argument('-c', '--cascade_dir',
 # following applies to sampler approach
 parser.add_argument('-n', '--n_queries', default=10, type=int,
                     help='number of queries')
+parser.add_argument('--batch_size', default=1, type=int,
+                    help='number of nodes queried per round')
 parser.add_argument('-m', '--sampling_method', default='loop_erased', type=str,
                     choices={'loop_erased', 'cut', 'cut_naive', 'simulation'},
                     help='the steiner tree sampling method')
@@ -62,10 +68,22 @@ parser.add_argument('-p', '--min_proba', default=0.0, type=float,
                     help='(minimum) threshold used for pruning candidate nodes')
 parser.add_argument('-e', '--num_estimation_nodes', default=None, type=int,
                     help='number of nodes used for error estimation')
+parser.add_argument('--node_sample_rel_std', default=None, type=float,
+                    help='adapt the number of estimation nodes to this relative std of the estimated error (capped by -e)')
+parser.add_argument('--compaction_threshold', default=None, type=float,
+                    help='sample on a re-indexed subgraph once the visible fraction of nodes drops below it')
+parser.add_argument('--branch_and_bound', action='store_true',
+                    help='(cond-entropy) skip candidates whose score lower bound cannot beat the best score')
+parser.add_argument('--incremental_pagerank', action='store_true',
+                    help='(pagerank) warm-start PageRank from the previous scores after each query')
+parser.add_argument('--lazy', action='store_true',
+                    help='(cond-entropy) re-use scores of previous rounds, re-evaluating only the top and changed candidates')
 
 parser.add_argument('-d', '--output_dir', default='outputs/queries', help='output directory')
 parser.add_argument('-j', '--n_jobs', type=int, default=-1, help='number of workers in parallel')
 parser.add_argument('-b', '--debug', action='store_true', help='if debug, use non-parallel')
+parser.add_argument('--worker_pool', action='store_true',
+                    help='if on, each worker loads the (memory-mapped) graph once and tasks carry only the cascade path')
 parser.add_argument('-v', '--verbose', action='store_true',
                     help='if verbose, verbose information is printed')
 
@@ -98,8 +116,9 @@ query_strategy = args.query_strategy
 min_proba = args.min_proba
 num_estimation_nodes = args.num_estimation_nodes
 
-g = load_graph_by_name(graph_name, weighted=False,
-                       suffix=graph_suffix)
+if not args.worker_pool:
+    g = load_graph_by_name(graph_name, weighted=False,
+                           suffix=graph_suffix)
 
 if query_strategy == 'random':
     strategy = (RandomQueryGenerator, {})
@@ -108,10 +127,11 @@ elif query_strategy == 'oracle-e':
 elif query_strategy == 'oracle-l':
     strategy = (LatestFirstOracle, {})
 elif query_strategy == 'pagerank':
-    strategy = (PRQueryGenerator, {})
+    strategy = (PRQueryGenerator, {'incremental': args.incremental_pagerank})
 elif query_strategy == 'entropy':
     strategy = (EntropyQueryGenerator, {'method': 'entropy', 'root_sampler': root_sampler,
-                                        'root_sampler_eps': args.root_pagerank_noise})
+                                        'root_sampler_eps': args.root_pagerank_noise,
+                                        'compaction_threshold': args.compaction_threshold})
 elif query_strategy == 'cond-entropy':
     print("min_proba={}".format(min_proba))
     print("num_estimation_nodes={}".format(num_estimation_nodes))
@@ -120,7 +140,11 @@ elif query_strategy == 'cond-entropy':
                                             'root_sampler': root_sampler,
                                             'root_sampler_eps': args.root_pagerank_noise,
                                             'min_proba': min_proba,
-                                            'n_node_samples': num_estimation_nodes})
+                                            'n_node_samples': num_estimation_nodes,
+                                            'node_sample_rel_std': args.node_sample_rel_std,
+                                            'branch_and_bound': args.branch_and_bound,
+                                            'lazy': args.lazy,
+                                            'compaction_threshold': args.compaction_threshold})
 
 elif query_strategy == 'mutual-info':
     strategy = (MutualInformationQueryGenerator,
@@ -129,7 +153,9 @@ elif query_strategy == 'mutual-info':
                  'root_sampler': root_sampler,
                  'root_sampler_eps': args.root_pagerank_noise,
                  'min_proba': min_proba,
-                 'n_node_samples': num_estimation_nodes})
+                 'n_node_samples': num_estimation_nodes,
+                 'node_sample_rel_std': args.node_sample_rel_std,
+                 'compaction_threshold': args.compaction_threshold})
 else:
     raise ValueError('invalid strategy name')
 
@@ -147,8 +173,17 @@ def one_round(
         sampling_method,
         n_samples,
         verbose,
-        cmd_args
+        cmd_args,
+        gi_cache=None
 ):
+    """
+    gi_cache: dict, if given, the random_steiner_tree graph is taken from (and put back to) `gi_cache['gi']`,
+      it's put back only if no node is isolated during querying
+      because node isolation in the random_steiner_tree graph cannot be undone
+
+    Returns:
+    bool: if the graph is changed (e.g., uninfected nodes are isolated)
+    """
     stime = time.time()
     c_id = os.path.basename(c_path).split('.')[0]
     d = output_dir
@@ -159,7 +194,7 @@ def one_round(
 
     if os.path.exists(outpath):
         print("{} processed already, skip".format(c_path))
-        return
+        return False
 
     print('\nquerying {} started, using {}\n'.format(
         c_path, query_method
@@ -169,7 +204,10 @@ def one_round(
     args = []  # sampling based method need a sampler to initialize
 
     weights = get_edge_weights(gv)
-    gi = from_gt(gv, weights=weights)
+    if gi_cache is not None and gi_cache.get('gi') is not None:
+        gi = gi_cache.pop('gi')
+    else:
+        gi = from_gt(gv, weights=weights)
 
     if issubclass(q_gen_cls, SamplingBasedGenerator):
         if sampling_method == 'simulation':
@@ -203,7 +241,11 @@ def one_round(
     q_gen = q_gen_cls(gv, *args, verbose=verbose, **param)
     sim = Simulator(gv, q_gen, gi=gi, print_log=verbose)
 
-    qs = sim.run(n_queries, obs, c)
+    qs = sim.run(n_queries, obs, c, batch_size=cmd_args.batch_size)
+
+    graph_changed = qs[1]['graph_changed']
+    if gi_cache is not None and not graph_changed:
+        gi_cache['gi'] = gi  # intact, reuse it for the next cascade
 
     time_cost = time.time() - stime
 
@@ -231,17 +273,72 @@ def one_round(
 
     meta_data = {'time_elapsed': time_cost}
     pkl.dump(meta_data, open(meta_outpath, 'wb'))
+    return graph_changed
+
+
+# per-process state in worker_pool mode
+_worker = {}
+
 
-cascade_generator = load_cascades(args.cascade_dir)
+def init_worker(graph_name, graph_suffix):
+    """build the graph once per worker from the memory-mapped CSR cache,
+
+    loading is faster than parsing the `.gt` file,
+    but each worker still holds its own copy of the graph_tool graph
+    """
+    openmp_set_num_threads(1)
+    csr = load_csr_graph_by_name(graph_name, weighted=False, suffix=graph_suffix)
+    _worker['g'] = csr.gt
+    _worker['gi_cache'] = {}
+
+
+def run_in_worker(c_path):
+    """a failing (e.g., timed out) cascade is reported and skipped, the sweep goes on"""
+    try:
+        with open(c_path, 'rb') as f:
+            obs, c = pkl.load(f)[:2]
+        one_round(
+            _worker['g'],
+            obs,
+            c,
+            c_path,
+            strategy[0],
+            strategy[1],
+            query_strategy,
+            output_dir,
+            sampling_method,
+            n_samples,
+            args.verbose,
+            args,
+            gi_cache=_worker['gi_cache']
+        )
+    except Exception as e:
+        print('skipping {}: {}: {}'.format(c_path, type(e).__name__, e))
 
 
 # run!
-if args.debug:
+if args.worker_pool:
+    c_paths = sorted(glob(args.cascade_dir + '/*.pkl'))
+    n_jobs = (args.n_jobs if args.n_jobs > 0 else multiprocessing.cpu_count())
+
+    # create the csr cache (if not there) once, before the workers memory-map it
+    load_csr_graph_by_name(graph_name, weighted=False, suffix=graph_suffix)
+
+    # fork: workers inherit the parsed args and the strategy
+    pool = multiprocessing.get_context('fork').Pool(
+        n_jobs,
+        initializer=init_worker,
+        initargs=(graph_name, graph_suffix)
+    )
+    with pool:
+        for _ in tqdm(pool.imap_unordered(run_in_worker, c_paths), total=len(c_paths)):
+            pass
+elif args.debug:
     print('====================')
     print('DEBUG MODE')
     print('====================')
     cls, param = strategy
-    for path, tpl in tqdm(cascade_generator):
+    for path, tpl in tqdm(load_cascades(args.cascade_dir)):
         one_round(
             g,
             tpl[0],
@@ -275,7 +372,7 @@ else:
             args.verbose,
             args
         )
-        for path, tpl in tqdm(cascade_generator)
+        for path, tpl in tqdm(load_cascades(args.cascade_dir))
     )
     
     Parallel(n_jobs=args.n_jobs)(jobs)
@@ -1,8 +1,9 @@
 import numpy as np
+import scipy.sparse as sp
 import itertools
 from copy import copy
 from collections import defaultdict
-from itertools import repeat, chain
+from itertools import repeat
 
 from graph_tool import Graph, GraphView, load_graph
 from graph_tool.search import bfs_search, BFSVisitor
@@ -72,6 +73,15 @@ def extract_nodes(g):
     return [int(u) for u in g.vertices()]
 
 
+def visible_mask(g):
+    """boolean array over all node ids (hidden ones included), True if the node is visible in `g`"""
+    vfilt, inverted = g.get_vertex_filter()
+    if vfilt is None:
+        return np.ones(g.num_vertices(ignore_filter=True), dtype=bool)
+    mask = vfilt.a.astype(bool)
+    return ~mask if inverted else mask
+
+
 def extract_edges(g):
     return [(int(u), int(v)) for u, v in g.edges()]
 
@@ -177,7 +187,6 @@ def gen_random_spanning_tree(g, root=None):
     efilt = random_spanning_tree(g, root=root)
     return GraphView(g, efilt=efilt)
 
-# @profile
 def contract_graph_by_nodes(g, nodes, weights=None):
     """
     contract graph by nodes (only for undirected)
@@ -198,49 +207,40 @@ def contract_graph_by_nodes(g, nodes, weights=None):
     if len(nodes) == 1:
         return g, weights
 
-    nodes = set(nodes)
+    nodes = np.asarray(list(set(nodes)), dtype=np.int64)
 
-    # print('nodes:', nodes)
-    
     # re-align the nodes
     # `v \in nodes` are considered node 0
-    # get the old node to new node mapping
-    o2n_map = {}
-    c = 1
-    for v in g.vertices():
-        v = int(v)
-        if v not in nodes:
-            o2n_map[v] = c
-            c += 1
-        else:
-            o2n_map[v] = 0
-    # print('o2n_map:', o2n_map)
+    # the other nodes are numbered 1, 2, ... in their original order
+    n = g.num_vertices(ignore_filter=True)
+    contracted = np.zeros(n, dtype=bool)
+    contracted[nodes] = True
+    vs = g.get_vertices()
+    remaining = vs[~contracted[vs]]
+
+    o2n_map = np.zeros(n, dtype=np.int64)
+    o2n_map[remaining] = np.arange(1, len(remaining) + 1)
 
     # calculate new edges and new weights
-    e2w = defaultdict(float)
-    for e in g.edges():
-        u, v = map(int, [e.source(), e.target()])
-        nu, nv = sorted([o2n_map[u], o2n_map[v]])
-        if weights:
-            e2w[(nu, nv)] += weights[g.edge(u, v)]
-        else:
-            e2w[(nu, nv)] += 1
+    # parallel edges in the new graph are merged by summing up their weights
+    edges = edge_array(g)
+    nu, nv = o2n_map[edges[:, 0]], o2n_map[edges[:, 1]]
+    nu, nv = np.minimum(nu, nv), np.maximum(nu, nv)
+    if weights is not None:
+        w = weights.a[edges[:, 2]]
+    else:
+        w = np.ones(len(edges))
 
-    # print('e2w:', e2w)
+    m = len(remaining) + 1
+    keys, inv = np.unique(nu * m + nv, return_inverse=True)
+    new_w = np.bincount(inv, weights=w, minlength=len(keys))
 
     # create the new graph
     new_g = Graph(directed=False)
-    # for _ in range(g.num_vertices() - len(nodes) + 1):
-    #     new_g.add_vertex()
-
-    edges = []
-    for u, v in e2w:
-        e = new_g.add_edge(u, v)
-        edges.append(e)
+    new_g.add_edge_list(np.column_stack((keys // m, keys % m)))
 
     new_weights = new_g.new_edge_property('float')
-    for e, w in zip(edges, e2w.values()):
-        new_weights[e] = w
+    new_weights.a = new_w
 
     return new_g, new_weights
 
@@ -306,15 +306,13 @@ def is_steiner_tree(t, X):
 def isolate_node(g, n):
     """mask out adjacent edges to `n` in `g`
     **with side-effect**
+
+    the edge filter is modified in place (the view picks it up)
+    for repeated isolation, `observation_state.ObservationState` is cheaper
     """
     efilt = g.get_edge_filter()[0]
-    v = g.vertex(n)
-    incident_edges = chain(v.out_edges(), v.in_edges())
-
-    for e in incident_edges:
-        # print('isolate node: hiding {}'.format(e))
-        efilt[e] = False
-    g.set_edge_filter(efilt)
+    eids = g.get_all_edges(n, [g.edge_index])[:, 2]  # both out- and in-edges
+    efilt.a[eids.astype(np.int64)] = False
 
 
 def hide_node(g, n):
@@ -350,42 +348,39 @@ def hide_disconnected_components(g, pivots):
     hide the components in `g` in which no pivot is in
 
     **with side effect**
-    """    
-    prop = label_components(g)[0]
-    v2c = {v: prop[v] for v in g.vertices()}
-    c2vs = defaultdict(set)
-    for v, c in v2c.items():
-        c2vs[c].add(v)
-
-    vs_to_show = set()
-    for v in pivots:
-        vs_to_show |= c2vs[v2c[v]]
+    """
+    comp = label_components(g, directed=False)[0].a
+    pivot_comps = comp[np.asarray(list(pivots), dtype=np.int64)]
 
     vfilt = g.get_vertex_filter()[0]
-    vfilt.set_value(False)
-    for v in vs_to_show:
-        vfilt[v] = True
-    g.set_vertex_filter(vfilt)
+    # labels of hidden nodes are meaningless, so keep them hidden
+    vfilt.a = np.logical_and(np.isin(comp, pivot_comps), vfilt.a > 0)
 
 
 def observe_uninfected_node(g, n, obs):
     """wrapper of isolate_node and hide_disconnected_components
     with side effect
+
+    `n` ends up in a component of its own, so it's hidden too
     """
     isolate_node(g, n)
-    # hide_disconnected_components(g, obs)
+    hide_disconnected_components(g, obs)
 
 
-def load_graph_by_name(name, weighted=False, suffix=''):
+def graph_path(name, weighted=False, suffix=''):
     suffix = suffix.strip()
+    if weighted:
+        return 'data/{}/graph_weighted{}.gt'.format(name, suffix)
+    else:
+        return 'data/{}/graph{}.gt'.format(name, suffix)
+
+
+def load_graph_by_name(name, weighted=False, suffix=''):
     if name == 'lattice':
         shape = (10, 10)
         g = lattice(shape)
     else:
-        if weighted:
-            path = 'data/{}/graph_weighted{}.gt'.format(name, suffix)
-        else:
-            path = 'data/{}/graph{}.gt'.format(name, suffix)
+        path = graph_path(name, weighted, suffix)
         print('load graph from {}'.format(path))
         g = load_graph(path)
     # assert not g.is_directed()
@@ -414,22 +409,58 @@ def has_vertex(g, i):
     return g._Graph__filter_state['vertex_filter'][0].a[i] > 0
 
 
-def k_hop_neighbors(v, g, k):
-    def aux(v, k, visited):
-        assert k >= 0
-        if k == 0:
-            return set()
-        else:
-            nbrs = set()
-            for u in g.get_out_neighbours(v):
-                if u not in visited:
-                    nbrs.add(u)
-                    visited.add(u)
-                    nbrs |= aux(u, k-1, visited)
-            return nbrs
+def csr_gather(indptr, indices, rows):
+    """concatenation of `indices[indptr[r]:indptr[r+1]]` for r in `rows`, without a python loop"""
+    starts = indptr[rows]
+    lens = indptr[rows + 1] - starts
+    offsets = np.repeat(starts - (np.cumsum(lens) - lens), lens)
+    return indices[offsets + np.arange(lens.sum())]
+
+
+def k_hop_neighbors(v, g, k, return_dist=False):
+    """
+    nodes within `k` hops from `v` (`v` excluded),
+    by BFS, one frontier at a time
+
+    g: graph_tool.Graph or csr_graph.CSRGraph (the latter is fully vectorized)
+
+    Returns:
+
+    - np.ndarray of nodes, ordered by distance
+    - np.ndarray of their distances (if `return_dist`)
+    """
+    if hasattr(g, 'indptr'):
+        n = len(g.indptr) - 1
 
-    visited = {v}
-    return aux(v, k, visited)
+        def expand(frontier):
+            return csr_gather(g.indptr, g.indices, frontier)
+    else:
+        n = g.num_vertices(ignore_filter=True)
+
+        def expand(frontier):
+            return np.concatenate(
+                [g.get_out_neighbours(u) for u in frontier] + [np.array([], dtype=np.int64)]
+            ).astype(np.int64)
+
+    visited = np.zeros(n, dtype=bool)
+    visited[v] = True
+    frontier = np.array([v], dtype=np.int64)
+    nodes, dists = [], []
+    for d in range(1, k + 1):
+        nbrs = np.unique(expand(frontier))
+        frontier = nbrs[~visited[nbrs]]
+        if len(frontier) == 0:
+            break
+        visited[frontier] = True
+        nodes.append(frontier)
+        dists.append(np.full(len(frontier), d, dtype=np.int64))
+
+    nodes = (np.concatenate(nodes) if nodes else np.array([], dtype=np.int64))
+    if return_dist:
+        dists = (np.concatenate(dists) if dists else np.array([], dtype=np.int64))
+        return nodes, dists
+    else:
+        return nodes
 
 
 def pagerank_scores(g, obs, eps=0.0):
@@ -452,6 +483,39 @@ def pagerank_scores(g, obs, eps=0.0):
     return p
 
 
+def personalized_pagerank(g, pers, damping=0.85, init=None, epsilon=1e-6, max_iter=1000):
+    """
+    PageRank by power iteration on the visible part of `g`,
+    with the same update rule as graph_tool's `pagerank`
+    (rank of dangling nodes is re-distributed according to `pers`)
+
+    init: starting point (e.g., the scores before the graph changed), `pers` if None
+
+    Returns:
+
+    np.ndarray indexed by node id (hidden nodes included)
+    """
+    n = g.num_vertices(ignore_filter=True)
+    edges = edge_array(g)
+    src, tgt = edges[:, 0], edges[:, 1]
+    if not g.is_directed():
+        src, tgt = np.concatenate((src, tgt)), np.concatenate((tgt, src))
+
+    out_deg = np.bincount(src, minlength=n).astype(np.float64)
+    dangling = visible_mask(g) & (out_deg == 0)
+    trans = sp.csr_matrix((1 / out_deg[src], (tgt, src)), shape=(n, n))
+
+    pers = np.asarray(pers, dtype=np.float64)
+    rank = (pers if init is None else np.asarray(init, dtype=np.float64) / np.sum(init))
+    for _ in range(max_iter):
+        new_rank = (1 - damping) * pers + damping * (trans @ rank + rank[dangling].sum() * pers)
+        delta = np.abs(new_rank - rank).sum()
+        rank = new_rank
+        if delta < epsilon:
+            break
+    return rank
+
+
 def get_edge_weights(g, key='weights'):
     if key not in g.edge_properties:
         # print('unweighted graph')
@@ -462,6 +526,67 @@ def get_edge_weights(g, key='weights'):
     return weights
 
 
+def edge_array(g):
+    """returns np.ndarray of shape (E, 3),
+
+    each row being (source, target, edge index) of a visible edge in `g`
+    """
+    return g.get_edges([g.edge_index]).astype(np.int64)
+
+
+def reverse_edge_rows(edges, n):
+    """
+    for each edge (u, v) in `edges`, find the row of its reverse edge (v, u)
+
+    the lookup is done by sorting packed keys u * n + v and binary search,
+    so it costs O(E log E) instead of one `g.edge` call per edge
+
+    Args:
+
+    edges: np.ndarray (E, >=2), the first two columns are source and target
+    n: upper bound of node ids (exclusive)
+
+    Returns:
+
+    np.ndarray (E, ) of row indices into `edges`, -1 if the reverse edge is absent
+    """
+    src, tgt = edges[:, 0].astype(np.int64), edges[:, 1].astype(np.int64)
+    keys = src * n + tgt
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+
+    rev_keys = tgt * n + src
+    pos = np.searchsorted(sorted_keys, rev_keys)
+    pos[pos == len(sorted_keys)] = 0  # out of bound, marked as missing below
+
+    rows = order[pos]
+    rows[sorted_keys[pos] != rev_keys] = -1
+    return rows
+
+
+def incidence_index(g):
+    """
+    CSR-like index of the edges incident to each node (both in and out),
+    the edge indices of node `v` are `eids[indptr[v]:indptr[v+1]]`
+
+    only visible edges are indexed
+
+    Returns:
+
+    - indptr: np.ndarray (N+1, )
+    - eids: np.ndarray (2E, )
+    """
+    n = g.num_vertices(ignore_filter=True)
+    edges = edge_array(g)
+    nodes = np.concatenate((edges[:, 0], edges[:, 1]))
+    eids = np.concatenate((edges[:, 2], edges[:, 2]))
+    order = np.argsort(nodes, kind='stable')
+
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(nodes, minlength=n), out=indptr[1:])
+    return indptr, eids[order]
+
+
 def reachable_node_set(g, source):
     prop = label_components(g)[0]
     cid = prop[source]
@@ -53,7 +53,7 @@ def infer_probas_from_queries(
         verbose=False,
         sampler_kwargs={},
 ):
-    n_nodes = g.num_vertices()
+    n_nodes = g.num_vertices(ignore_filter=True)
 
     assert root_sampler_name in {'random', 'pagerank', 'true_root'}
 
@@ -138,14 +138,16 @@ def infer_probas_from_queries(
                                                  root_sampler=root_sampler,
                                                  log=False,
                                                  verbose=False)
-            estimator.update_trees(new_samples, node_update_info)
+            estimator.update_trees(new_samples, node_update_info,
+                                   invalidated=sampler.invalidated)
 
             # new probas
             probas = infection_probability(g, obs_inf, sampler, error_estimator=estimator)
 
             # make sure data dimension does not change
             assert len(probas) == n_nodes
-            assert g.num_vertices() == n_nodes, '{} != {}'.format(g.num_vertices(), n_nodes)
+            assert g.num_vertices(ignore_filter=True) == n_nodes, \
+                '{} != {}'.format(g.num_vertices(ignore_filter=True), n_nodes)
 
             probas_list.append(probas)
 
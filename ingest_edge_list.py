@@ -0,0 +1,226 @@
+# coding: utf-8
+
+"""
+convert a (possibly huge) edge list, e.g., from SNAP, to graph_tool format
+
+the edge list is read in chunks into numpy arrays,
+nodes are relabeled to contiguous ids and only the largest (weakly) connected component is kept.
+
+no networkx or GraphML is involved.
+
+example:
+
+> python3 ingest_edge_list.py -i data/auto-sys/graph.txt -o data/auto-sys/graph.gt
+"""
+
+import argparse
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from graph_tool import Graph
+
+
+def dedupe_edges(src, tgt, weights=None):
+    """
+    remove self-loops and duplicate edges (the first weight is kept),
+    edges are returned sorted by (source, target)
+    """
+    mask = (src != tgt)
+    src, tgt = src[mask], tgt[mask]
+    # pack (source, target) into one int64 key over the ranks of the labels,
+    # which keeps the (source, target) order
+    new_src, new_tgt, labels = relabel_nodes(src, tgt)
+    _, first = np.unique(new_src * len(labels) + new_tgt, return_index=True)
+    if weights is not None:
+        weights = weights[mask][first]
+    return src[first], tgt[first], weights
+
+
+def read_edge_list(path, chunksize=1000000, weight_column=None, sep=r'\s+', comment='#'):
+    """
+    read the edge list in chunks of `chunksize` lines,
+
+    self-loops and duplicate edges (the first weight is kept) are dropped within each chunk,
+    then across chunks once all of them are read,
+    so memory is proportional to the number of edges that are distinct within their chunk
+
+    Returns:
+
+    - np.ndarray (E, ) of source ids (original labels)
+    - np.ndarray (E, ) of target ids (original labels)
+    - np.ndarray (E, ) of weights, None if `weight_column` is None
+    """
+    usecols = [0, 1]
+    if weight_column is not None:
+        usecols.append(weight_column)
+
+    reader = pd.read_csv(
+        path, sep=sep, comment=comment, header=None,
+        usecols=usecols, chunksize=chunksize
+    )
+    srcs, tgts, weights = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)], [np.zeros(0)]
+    for chunk in reader:
+        w = None
+        if weight_column is not None:
+            w = chunk[weight_column].values.astype(np.float64)
+        s, t, w = dedupe_edges(chunk[0].values.astype(np.int64),
+                               chunk[1].values.astype(np.int64),
+                               w)
+        srcs.append(s)
+        tgts.append(t)
+        weights.append(w)
+
+    # chunks are in file order, so the first weight is still kept
+    return dedupe_edges(np.concatenate(srcs), np.concatenate(tgts),
+                        np.concatenate(weights) if weight_column is not None else None)
+
+
+def relabel_nodes(src, tgt):
+    """
+    map node labels to 0, 1, ..., n-1
+
+    Returns:
+
+    - new source ids
+    - new target ids
+    - np.ndarray (n, ) that maps new ids to original labels
+    """
+    labels, inv = np.unique(np.concatenate((src, tgt)), return_inverse=True)
+    return inv[:len(src)], inv[len(src):], labels
+
+
+def largest_component_mask(src, tgt, n):
+    """
+    boolean mask over nodes that are in the largest weakly connected component
+    """
+    adj = coo_matrix((np.ones(len(src), dtype=np.int8), (src, tgt)), shape=(n, n))
+    _, comp = connected_components(adj, directed=True, connection='weak')
+    return comp == np.bincount(comp).argmax()
+
+
+def clean_edges(src, tgt, weights, n, directed=True, symmetrize=False):
+    """
+    remove self-loops and duplicate edges (the first weight is kept),
+
+    if `symmetrize`, add (v, u) for each (u, v) if (v, u) is absent
+    if not `directed`, (u, v) and (v, u) are considered duplicates
+    """
+    mask = (src != tgt)
+    src, tgt = src[mask], tgt[mask]
+    if weights is not None:
+        weights = weights[mask]
+
+    if not directed:
+        src, tgt = np.minimum(src, tgt), np.maximum(src, tgt)
+    elif symmetrize:
+        src, tgt = np.concatenate((src, tgt)), np.concatenate((tgt, src))
+        if weights is not None:
+            weights = np.concatenate((weights, weights))
+
+    _, first = np.unique(src * n + tgt, return_index=True)
+    if weights is not None:
+        weights = weights[first]
+    return src[first], tgt[first], weights
+
+
+def build_graph(src, tgt, weights, n, directed=True):
+    g = Graph(directed=directed)
+    g.add_vertex(n)
+    if weights is not None:
+        w = g.new_edge_property('float')
+        g.add_edge_list(np.column_stack((src, tgt, weights)), eprops=[w])
+        g.edge_properties['weights'] = w
+    else:
+        g.add_edge_list(np.column_stack((src, tgt)))
+    return g
+
+
+def ingest(path, directed=False, symmetrize=False,
+           weight_column=None,
+           p_min=None, p_max=None,
+           only_lcc=True,
+           chunksize=1000000,
+           verbose=True):
+    """
+    read edge list at `path` and return the graph_tool Graph
+
+    weights are taken from `weight_column` if given,
+    otherwise drawn uniformly from [p_min, p_max] if both are given
+    (as in `make_graph_weighted.py`)
+    """
+    src, tgt, weights = read_edge_list(path, chunksize, weight_column)
+    if verbose:
+        print('read {} edges'.format(len(src)))
+
+    src, tgt, labels = relabel_nodes(src, tgt)
+    n = len(labels)
+
+    if only_lcc:
+        in_lcc = largest_component_mask(src, tgt, n)
+        edge_mask = in_lcc[src]  # both end points are in the same component
+        src, tgt = src[edge_mask], tgt[edge_mask]
+        if weights is not None:
+            weights = weights[edge_mask]
+
+        o2n = np.cumsum(in_lcc) - 1
+        src, tgt = o2n[src], o2n[tgt]
+        labels = labels[in_lcc]
+        n = len(labels)
+        if verbose:
+            print('largest component: {} nodes'.format(n))
+
+    src, tgt, weights = clean_edges(
+        src, tgt, weights, n,
+        directed=directed, symmetrize=symmetrize
+    )
+
+    if weights is None and p_min is not None and p_max is not None:
+        weights = np.random.random(len(src)) * (p_max - p_min) + p_min
+
+    g = build_graph(src, tgt, weights, n, directed=directed)
+    label_prop = g.new_vertex_property('int64_t')
+    label_prop.a = labels
+    g.vertex_properties['label'] = label_prop
+
+    if verbose:
+        print('graph: {} nodes, {} edges'.format(g.num_vertices(), g.num_edges()))
+    return g
+
+
+def main():
+    parser = argparse.ArgumentParser(description='')
+    parser.add_argument('-i', '--input', required=True, help='path of the edge list')
+    parser.add_argument('-o', '--output', required=True, help='output path (.gt)')
+    parser.add_argument('-d', '--directed', action='store_true', help='')
+    parser.add_argument('-s', '--symmetrize', action='store_true',
+                        help='add reverse edges (v, u) for each (u, v), only for directed graph')
+    parser.add_argument('-w', '--weight_column', type=int, default=None,
+                        help='column index of the edge weight')
+    parser.add_argument('--p_min', type=float, default=None,
+                        help='lower bound for random edge weight')
+    parser.add_argument('--p_max', type=float, default=None,
+                        help='upper bound for random edge weight')
+    parser.add_argument('--keep_all_components', action='store_true',
+                        help='do not extract the largest component')
+    parser.add_argument('-c', '--chunksize', type=int, default=1000000,
+                        help='number of lines read at a time')
+
+    args = parser.parse_args()
+
+    g = ingest(
+        args.input,
+        directed=args.directed,
+        symmetrize=args.symmetrize,
+        weight_column=args.weight_column,
+        p_min=args.p_min,
+        p_max=args.p_max,
+        only_lcc=not args.keep_all_components,
+        chunksize=args.chunksize
+    )
+    g.save(args.output)
+    print('saved to {}'.format(args.output))
+
+
+if __name__ == '__main__':
+    main()
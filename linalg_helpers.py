@@ -1,4 +1,6 @@
 import numpy as np
+from scipy.sparse.linalg import splu
+from scipy.sparse.csgraph import connected_components
 from graph_tool.spectral import laplacian
 
 # @profile
@@ -17,3 +19,37 @@ def num_spanning_trees_dense(g, weights=None):
     l = l.todense()
     l0 = l[:-1, :-1]
     return np.linalg.det(l0)
+
+
+def log_num_spanning_trees(g, weights=None):
+    """compute the log of the number of spanning trees
+    (or of the sum of tree weights, i.e., the partition function, if `weights` is given)
+
+    uses sparse LU decomposition on the reduced laplacian,
+    log|det| is the sum of log|U_ii| (L has unit diagonal and permutations only change the sign)
+
+    Param:
+    ---------
+
+    g: Graph
+    weights: edge_property_map
+
+    Return:
+    ---------
+    float, -inf if there is no spanning tree (e.g., `g` is disconnected)
+    """
+    l = laplacian(g, weight=weights).tocsc()
+    l.eliminate_zeros()  # zero-weight edges
+    n_comps = connected_components(l, directed=True, connection='weak')[0]
+    if n_comps > 1:
+        # the reduced laplacian is singular, but LU might not detect it numerically
+        return -np.inf
+
+    l0 = l[:-1, :-1]
+    try:
+        lu = splu(l0)
+    except RuntimeError:
+        # exactly singular
+        return -np.inf
+    with np.errstate(divide='ignore'):
+        return np.log(np.abs(lu.U.diagonal())).sum()
@@ -1,35 +1,58 @@
 # coding: utf-8
 
-import sys
+import argparse
 import numpy as np
-from graph_helpers import load_graph_by_name
-from preprocess_graph import reverse_edge_weights
+from graph_helpers import load_graph_by_name, edge_array
 
 
-graph_name = sys.argv[1]
-g = load_graph_by_name(graph_name, weighted=True)
+def stochastic_edge_weights(g, reverse=False):
+    """
+    edge weights normalized by in-degree, w(v, u) = 1 / in_deg(u),
+    so that the weighted in-degree of every node is 1
 
+    if `reverse`, the weights are as if they are reversed (see `preprocess_graph.reverse_edge_weights`),
+    i.e., w(u, v) = 1 / in_deg(u), so that the weighted out-degree is 1 (assuming `g` is symmetric)
 
-w = g.new_edge_property('float')
-in_deg = g.degree_property_map('in', weight=None)
-for u in g.vertices():
-    for v in g.vertex(u).in_neighbours():  # v -> u
-        w[g.edge(v, u)] = 1 / in_deg[u]
+    computed in one pass over the edge array
 
+    Returns:
 
-in_deg_weighted = g.degree_property_map('in', weight=w)
-assert np.all(np.isclose(in_deg_weighted.a, 1)), 'maybe self-loops are not removed'
+    edge_property_map
+    """
+    in_deg = g.degree_property_map('in').a
+    edges = edge_array(g)
+    if reverse:
+        nodes = edges[:, 0]
+    else:
+        nodes = edges[:, 1]
 
+    w = g.new_edge_property('float')
+    w.a[edges[:, 2]] = 1 / in_deg[nodes]
+    return w
 
-g.edge_properties['weights'] = w
 
-g.save('data/{}/graph_sto.gt'.format(graph_name))
+def main():
+    parser = argparse.ArgumentParser(description='')
+    parser.add_argument('graph', help='graph name')
+    args = parser.parse_args()
 
-rev_g = reverse_edge_weights(g)
+    graph_name = args.graph
+    g = load_graph_by_name(graph_name, weighted=True)
 
-out_deg_weighted = g.degree_property_map('out', weight=rev_g.edge_properties['weights'])
-assert np.all(np.isclose(out_deg_weighted.a, 1))
+    w = stochastic_edge_weights(g)
+    in_deg_weighted = g.degree_property_map('in', weight=w)
+    assert np.all(np.isclose(in_deg_weighted.a, 1)), 'maybe self-loops are not removed'
 
+    g.edge_properties['weights'] = w
+    g.save('data/{}/graph_sto.gt'.format(graph_name))
 
-rev_g.save('data/{}/graph_sto_rev.gt'.format(graph_name))
+    w_rev = stochastic_edge_weights(g, reverse=True)
+    out_deg_weighted = g.degree_property_map('out', weight=w_rev)
+    assert np.all(np.isclose(out_deg_weighted.a, 1))
 
+    g.edge_properties['weights'] = w_rev
+    g.save('data/{}/graph_sto_rev.gt'.format(graph_name))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,3 +3,81 @@ import numpy as np
 
 def hellinger_distance(a, b):
     return np.sqrt(1 - np.sum(np.sqrt(a * b)))
+
+
+def inclusion_proba(weights, n):
+    """
+    inclusion probabilities proportional to `weights`, summing up to `n`,
+    those exceeding 1 are capped at 1 and the rest is re-scaled
+
+    items with zero weight are never included,
+    so the sum is less than `n` if there are fewer than `n` of the others
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    proba = np.zeros(len(weights))
+    free = weights > 0
+    n = min(n, free.sum())
+    n_capped = 0
+    while free.any():
+        proba[free] = (n - n_capped) * weights[free] / weights[free].sum()
+        capped = free & (proba >= 1)
+        if not capped.any():
+            break
+        proba[capped] = 1
+        n_capped += capped.sum()
+        free &= ~capped
+    return proba
+
+
+def systematic_sample(proba):
+    """
+    sample without replacement, item `i` being included with probability `proba[i]`,
+    using systematic sampling over a random permutation
+
+    the sample size is `round(proba.sum())` if the sum is an integer
+
+    Returns:
+    indices of the sampled items
+    """
+    proba = np.asarray(proba, dtype=np.float64)
+    perm = np.random.permutation(len(proba))
+    cumsum = np.cumsum(proba[perm])
+    u = np.random.rand()
+    # number of points in {u, u+1, u+2, ...} falling into [cumsum[i-1], cumsum[i])
+    hits = np.ceil(cumsum - u) - np.ceil(np.append(0, cumsum[:-1]) - u)
+    return np.sort(perm[hits > 0])
+
+
+def sample_size_for_rel_std(weights, values, rel_std, max_size=None):
+    """
+    smallest sample size `n` such that the Horvitz-Thompson estimate of `values.sum()`,
+    using inclusion probabilities `inclusion_proba(weights, n)`,
+    has (approximately) relative standard deviation at most `rel_std`
+
+    the variance is approximated by that of Poisson sampling:
+    sum_i (1 - pi_i) / pi_i * values_i^2
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    total = values[weights > 0].sum()
+    hi = int((weights > 0).sum())
+    if max_size is not None:
+        hi = min(hi, max_size)
+    if total <= 0 or hi == 0:
+        return hi
+
+    def rel_std_of(n):
+        proba = inclusion_proba(weights, n)
+        mask = proba > 0
+        var = ((1 - proba[mask]) / proba[mask] * values[mask] ** 2).sum()
+        return np.sqrt(var) / total
+
+    # the variance decreases with n
+    lo = 1
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if rel_std_of(mid) <= rel_std:
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
@@ -20,7 +20,7 @@ def build_closure(g, terminals,
     terminals = list(terminals)
     gc = Graph(directed=False)
 
-    gc.add_vertex(g.num_vertices())
+    gc.add_vertex(g.num_vertices(ignore_filter=True))
 
     edges_with_weight = set()
     r2pred = {}  # root to predecessor map (from bfs)
@@ -0,0 +1,60 @@
+import numpy as np
+from random_steiner_tree.util import isolate_vertex
+
+from graph_helpers import incidence_index, hide_disconnected_components
+
+
+class ObservationState():
+    """
+    graph state that changes as nodes are observed
+
+    - `edge_mask`: the array of the edge filter of `g` (modified in place, so the view follows)
+    - uninfected nodes are isolated both in `g` and in the sampler graph `gi`,
+      then components of `g` without infected nodes are hidden (they are not reachable by the cascade)
+    - `version` is increased whenever the graph changes, caches can key on it
+
+    the graph structure (the set of edges) should not change after creation
+    """
+    def __init__(self, g, gi=None):
+        """
+        g: graph_tool.Graph or graph_tool.GraphView
+        gi: random_steiner_tree.Graph
+        """
+        self.g = g
+        self.gi = gi
+
+        efilt, inverted = g.get_edge_filter()
+        assert not inverted, 'inverted edge filter is not supported'
+        if efilt is None:
+            efilt = g.new_edge_property('bool')
+            efilt.a = True
+            g.set_edge_filter(efilt)
+        self.edge_mask = efilt.a
+
+        if g.get_vertex_filter()[0] is None:
+            vfilt = g.new_vertex_property('bool')
+            vfilt.a = True
+            g.set_vertex_filter(vfilt)
+
+        self._indptr, self._incident_edges = incidence_index(g)
+        self.uninfected = []
+        self.version = 0
+
+    def incident_edges(self, n):
+        return self._incident_edges[self._indptr[n]:self._indptr[n+1]]
+
+    def isolate_node(self, n):
+        """mask out edges adjacent to `n`"""
+        self.edge_mask[self.incident_edges(n)] = False
+        if self.gi is not None:
+            isolate_vertex(self.gi, n)
+        self.version += 1
+
+    def observe_uninfected_node(self, n, obs):
+        """`obs`: the infected nodes so far"""
+        self.isolate_node(n)
+        hide_disconnected_components(self.g, obs)
+        self.uninfected.append(n)
+
+    def is_isolated(self, n):
+        return not self.edge_mask[self.incident_edges(n)].any()
@@ -1,5 +1,11 @@
 import argparse
-from graph_helpers import load_graph_by_name, get_edge_weights
+import numpy as np
+from graph_helpers import (
+    load_graph_by_name,
+    get_edge_weights,
+    edge_array,
+    reverse_edge_rows
+)
 
 
 def normalize_globally(g):
@@ -12,29 +18,31 @@ def normalize_globally(g):
     new_weights.a /= w_max
     new_deg = new_g.degree_property_map("out", new_weights)
 
-    # add self-loops
-    self_loops = [(v, v) for v in new_g.vertices()]
-    new_g.add_edge_list(self_loops)
-
-    # assign new weights
-    new_weights = get_edge_weights(new_g)
-    for v, v in self_loops:
-        new_weights[new_g.edge(v, v)] = 1 - new_deg[v]
+    # add self-loops together with their weights in one go
+    vs = new_g.get_vertices()
+    self_loops = np.column_stack((vs, vs, 1 - new_deg.a[vs]))
+    new_g.add_edge_list(self_loops, eprops=[new_weights])
 
     new_g.edge_properties['weights'] = new_weights
     return new_g
 
 
 def reverse_edge_weights(g):
+    """
+    swap the weight of each edge (u, v) with the weight of (v, u)
+
+    edges without a reverse edge keep their weights
+    """
     print('reversing')
     weights = get_edge_weights(g)
-    for e in g.edges():
-        u, v = int(e.source()), int(e.target())
-        if u < v:
-            er = g.edge(e.target(), e.source())
-            # print('before', weights[e], weights[er])
-            weights[e], weights[er] = weights[er], weights[e]
-            # print('after', weights[e], weights[er])
+    edges = edge_array(g)
+    rev_rows = reverse_edge_rows(edges, g.num_vertices(ignore_filter=True))
+
+    has_rev = (rev_rows >= 0)
+    eids = edges[has_rev, 2]
+    rev_eids = edges[rev_rows[has_rev], 2]
+    weights.a[eids] = weights.a[rev_eids]  # fancy indexing reads before writing
+
     g.edge_properties['weights'] = weights
     return g
 
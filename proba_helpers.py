@@ -3,7 +3,13 @@ from collections import Counter
 
 from random_steiner_tree import random_steiner_tree
 
-from graph_helpers import swap_end_points, extract_nodes_from_tuples
+from graph_helpers import (
+    swap_end_points,
+    extract_nodes_from_tuples,
+    edge_array,
+    reverse_edge_rows,
+    csr_gather
+)
 
 
 def tree_probability_gt(out_degree, p_dict, edges, using_log=True):
@@ -52,6 +58,118 @@ def ic_cascade_probability_gt(g, p_dict, cascade_edges, nbr_dict, using_log=True
         return probas_from_active_edges * probas_from_inactive_edges
 
 
+def segment_sum(values, lengths, dtype=np.float64):
+    """sum of consecutive segments of `values`, segment i being of length `lengths[i]`
+
+    empty segments sum to 0 (`np.add.reduceat` alone does not handle them)
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    out = np.zeros(len(lengths), dtype=dtype)
+    nonempty = lengths > 0
+    if nonempty.any():
+        offsets = np.cumsum(lengths) - lengths
+        out[nonempty] = np.add.reduceat(values, offsets[nonempty])
+    return out
+
+
+class LogProbaTables():
+    """
+    per-edge and per-node tables to evaluate tree/cascade probabilities in the log domain,
+    for many trees at once
+
+    a tree is given as an array of edge rows (see `edge_rows`),
+    a batch of trees as the concatenated rows plus the number of edges of each tree
+
+    built from the visible edges of `g`, so it should be re-built when the graph changes
+    """
+    def __init__(self, g, p):
+        """
+        g: graph_tool.Graph
+        p: edge property map of infection probabilities
+        """
+        edges = edge_array(g)
+        self.n = g.num_vertices(ignore_filter=True)
+        self.src, self.tgt = edges[:, 0], edges[:, 1]
+        w = p.a[edges[:, 2]].astype(np.float64)
+
+        keys = self.src * self.n + self.tgt
+        self._key_order = np.argsort(keys, kind='stable')
+        self._sorted_keys = keys[self._key_order]
+
+        with np.errstate(divide='ignore'):
+            self.log_p = np.log(w)
+            # log weighted out-degree
+            self.log_out_degree = np.log(np.bincount(self.src, weights=w, minlength=self.n))
+
+            # for edge (u, w), log(1 - p(w, u)), the transposed edge being inactive
+            # an absent reverse edge never fires
+            rev = reverse_edge_rows(edges, self.n)
+            p_rev = np.where(rev >= 0, w[rev], 0.0)
+            self.log_1mp_rev = np.log(1 - p_rev)
+
+        # out-edges of each node, as rows
+        self._out_rows = np.argsort(self.src, kind='stable')
+        self._out_indptr = np.zeros(self.n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.src, minlength=self.n), out=self._out_indptr[1:])
+
+    def edge_rows(self, edges):
+        """edge tuples -> rows in the tables"""
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        keys = edges[:, 0] * self.n + edges[:, 1]
+        pos = np.searchsorted(self._sorted_keys, keys)
+        pos = np.minimum(pos, len(self._sorted_keys) - 1)
+        found = (len(self._sorted_keys) > 0) & (self._sorted_keys[pos] == keys)
+        if not np.all(found):
+            missing = edges[~found][0]
+            raise KeyError(tuple(missing))
+        return self._key_order[pos]
+
+    def batch_rows(self, trees):
+        """list of edge tuples -> (concatenated rows, number of edges per tree)"""
+        lengths = np.array([len(t) for t in trees], dtype=np.int64)
+        if lengths.sum() == 0:
+            return np.zeros(0, dtype=np.int64), lengths
+        return self.edge_rows([e for t in trees for e in t]), lengths
+
+    def tree_log_proba(self, rows, lengths):
+        """log probability that the random walk based sampler generates each tree,
+
+        same as `tree_probability_gt`
+        """
+        return segment_sum(self.log_p[rows] - self.log_out_degree[self.src[rows]], lengths)
+
+    def cascade_log_proba(self, rows, lengths):
+        """same as `cascade_probability_gt`"""
+        return segment_sum(self.log_p[rows], lengths)
+
+    def ic_cascade_log_proba(self, rows, lengths):
+        """same as `ic_cascade_probability_gt`:
+
+        active edges contribute log p,
+        and for each source node u of the tree, each uninfected neighbour w
+        contributes log(1 - p(w, u))
+        """
+        n_trees = len(lengths)
+        log_proba = segment_sum(self.log_p[rows], lengths)
+
+        tree_id = np.repeat(np.arange(n_trees, dtype=np.int64), lengths)
+        src, tgt = self.src[rows], self.tgt[rows]
+
+        # (tree, node) pairs packed into one key
+        source_keys = np.unique(tree_id * self.n + src)
+        infected_keys = np.unique(np.concatenate((source_keys, tree_id * self.n + tgt)))
+        s_tree, s_node = np.divmod(source_keys, self.n)
+
+        # neighbours of the sources, dropping the infected ones
+        nbr_rows = csr_gather(self._out_indptr, self._out_rows, s_node)
+        nbr_tree = np.repeat(s_tree, self._out_indptr[s_node + 1] - self._out_indptr[s_node])
+        inactive = ~np.isin(nbr_tree * self.n + self.tgt[nbr_rows], infected_keys)
+        log_proba += np.bincount(nbr_tree[inactive],
+                                 weights=self.log_1mp_rev[nbr_rows[inactive]],
+                                 minlength=n_trees)
+        return log_proba
+
+
 def tree_probability_nx(g, edges):
     numer = np.product([g[u][v]['weight'] for u, v in edges])
     denum = np.product([g.out_degree(u, weight='weight') for u, v in edges])
@@ -67,3 +185,157 @@ def sampled_tree_freqs(gi, X, root, sampling_method, N):
              for i in range(N)]
     tree_freq = Counter(trees)
     return tree_freq
+
+
+def _mix64(x):
+    """splitmix64 finalizer on a uint64 array"""
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def tree_fingerprints(trees, n):
+    """
+    64-bit fingerprint of each tree (a tuple of edges), computed in batch
+
+    the fingerprint is the (wrapping) sum of the hashed edges,
+    so it does not depend on the edge order
+
+    n: upper bound of node ids (exclusive)
+    """
+    lengths = np.array([len(t) for t in trees], dtype=np.int64)
+    if lengths.sum() == 0:
+        return np.zeros(len(trees), dtype=np.uint64)
+    edges = np.array([e for t in trees for e in t], dtype=np.uint64)
+    edge_hashes = _mix64(edges[:, 0] * np.uint64(n) + edges[:, 1])
+    return segment_sum(edge_hashes, lengths, dtype=np.uint64)
+
+
+class TreeFreqEstimator():
+    """
+    streaming estimation of the distribution of sampled trees
+
+    - trees are reduced to 64-bit fingerprints as they come, counts are kept in two arrays
+      (sorted fingerprints and their counts)
+    - one representative tree per fingerprint is kept to evaluate expected probabilities
+    - if `capacity` is given, only the heavy hitters are kept (Misra-Gries),
+      each count being under-estimated by at most n_samples / (capacity + 1)
+    """
+    def __init__(self, n, capacity=None):
+        """
+        n: upper bound of node ids (exclusive)
+        capacity: max number of distinct trees to keep (None for exact counts)
+        """
+        self.n = n
+        self.capacity = capacity
+        self.n_samples = 0
+        self.fingerprints = np.zeros(0, dtype=np.uint64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self._trees = {}
+        self._evaluated = {}  # func -> {fingerprint: value}
+
+    @property
+    def support_size(self):
+        return len(self.fingerprints)
+
+    def add(self, trees):
+        """add a batch of sampled trees"""
+        if len(trees) == 0:
+            return
+        fps, first_idx, counts = np.unique(tree_fingerprints(trees, self.n),
+                                           return_index=True, return_counts=True)
+        all_fps = np.concatenate((self.fingerprints, fps))
+        all_counts = np.concatenate((self.counts, counts))
+        self.fingerprints, inv = np.unique(all_fps, return_inverse=True)
+        self.counts = np.bincount(inv, weights=all_counts).astype(np.int64)
+        self.n_samples += len(trees)
+
+        if self.capacity is not None and len(self.counts) > self.capacity:
+            # decrement all by the (capacity + 1)-th largest count
+            threshold = np.partition(self.counts, -(self.capacity + 1))[-(self.capacity + 1)]
+            self.counts -= threshold
+            kept = self.counts > 0
+            for fp in self.fingerprints[~kept]:
+                self._trees.pop(fp, None)
+            self.fingerprints, self.counts = self.fingerprints[kept], self.counts[kept]
+
+        kept = np.isin(fps, self.fingerprints)
+        for fp, i in zip(fps[kept], first_idx[kept]):
+            self._trees.setdefault(fp, trees[i])
+
+    def tree(self, fp):
+        return self._trees[fp]
+
+    def probas(self, fingerprints=None):
+        """empirical probabilities of `fingerprints` (default to the support), 0 if unseen"""
+        if fingerprints is None:
+            return self.counts / self.n_samples
+        pos = np.searchsorted(self.fingerprints, fingerprints)
+        pos = np.minimum(pos, max(len(self.fingerprints) - 1, 0))
+        found = (self.support_size > 0) & (self.fingerprints[pos] == fingerprints)
+        return np.where(found, self.counts[pos], 0) / self.n_samples
+
+    def evaluate(self, func, fingerprints=None):
+        """
+        `func(tree)` for each tree in `fingerprints` (default to the support),
+        results are cached, so only newly seen trees are evaluated on repeated calls
+        """
+        if fingerprints is None:
+            fingerprints = self.fingerprints
+        cache = self._evaluated.setdefault(func, {})
+        values = []
+        for fp in fingerprints:
+            if fp not in cache:
+                cache[fp] = func(self._trees[fp])
+            values.append(cache[fp])
+        return np.array(values, dtype=np.float64)
+
+    def distances_to(self, func):
+        """distances between the empirical distribution and the one given by `func`
+        (un-normalized tree probability), normalized on the support
+        """
+        expected = self.evaluate(func)
+        return distribution_distances(self.probas(), expected / expected.sum())
+
+
+def distribution_distances(p1, p2):
+    """l1 distance, cosine similarity and hellinger distance between two distributions"""
+    p1, p2 = np.asarray(p1, dtype=np.float64), np.asarray(p2, dtype=np.float64)
+    norm = np.sqrt(np.dot(p1, p1) * np.dot(p2, p2))
+    return {
+        'l1_dist': np.abs(p1 - p2).sum(),
+        'cosine_sim': np.dot(p1, p2) / norm if norm > 0 else 0.0,
+        'hellinger_dist': np.sqrt(0.5 * ((np.sqrt(p1) - np.sqrt(p2)) ** 2).sum())
+    }
+
+
+def union_support(*estimators):
+    """
+    sorted fingerprints seen by any of `estimators`,
+    and a representative tree of each
+    """
+    fps = np.unique(np.concatenate([e.fingerprints for e in estimators]))
+    trees = {}
+    for e in estimators:
+        trees.update(e._trees)
+    return fps, [trees[fp] for fp in fps]
+
+
+def streaming_tree_freqs(gi, X, root, sampling_method, N, n,
+                         chunk_size=10000, capacity=None):
+    """
+    like `sampled_tree_freqs` but never holds more than `chunk_size` trees in memory
+
+    n: upper bound of node ids (exclusive)
+
+    Returns:
+
+    TreeFreqEstimator
+    """
+    estimator = TreeFreqEstimator(n, capacity=capacity)
+    while estimator.n_samples < N:
+        size = min(chunk_size, N - estimator.n_samples)
+        estimator.add([swap_end_points(random_steiner_tree(gi, X, root, method=sampling_method))
+                       for i in range(size)])
+    return estimator
@@ -112,7 +112,7 @@ def one_round(
     q_gen = query_strategy_cls(gv, *args, verbose=verbose, **query_strategy_param)
     sim = Simulator(gv, q_gen, gi=gi, print_log=verbose)
 
-    qs = sim.run(n_queries, obs, c)
+    qs = sim.run(n_queries, obs, c, batch_size=cmd_args.batch_size)
     
     time_cost = time.time() - stime
 
@@ -1,9 +1,12 @@
-import random
+import heapq
 import numpy as np
 from tqdm import tqdm
-from core import uncertainty_scores
+from core import node_uncertainty
 from graph_tool.centrality import pagerank
-from graph_helpers import extract_nodes
+from graph_helpers import visible_mask, personalized_pagerank
+from candidate_pool import CandidatePool
+from math_helpers import inclusion_proba, systematic_sample, sample_size_for_rel_std
+from active_subgraph import ActiveSubgraph
 from root_sampler import build_root_sampler_by_pagerank_score, build_true_root_sampler
 
 
@@ -23,12 +26,22 @@ class BaseQueryGenerator():
         self.verbose = verbose
 
     def receive_observation(self, obs, c):
-        self._cand_pool = set(extract_nodes(self.g)) - set(obs)
+        mask = visible_mask(self.g)
+        mask[np.asarray(obs, dtype=np.int64)] = False
+        self._cand_pool = CandidatePool(mask)
         self.c = c
 
     def update_observation(self, g, inf_nodes, q, label, c):
         pass
 
+    def update_observations(self, g, inf_nodes, node_labels, c):
+        """observations of a batch of queries,
+
+        node_labels: dict of node -> label
+        """
+        for q, label in node_labels.items():
+            self.update_observation(g, inf_nodes, q, label, c)
+
     def select_query(self, *args, **kwargs):
         if len(self._cand_pool) == 0:
             raise NoMoreQuery()
@@ -37,14 +50,26 @@ class BaseQueryGenerator():
         self._cand_pool.remove(q)
         return q
 
+    def select_queries(self, g, inf_nodes, k):
+        """select `k` nodes to be queried together (fewer if candidates run out),
+
+        by default, the top `k` nodes by the single query criterion
+        """
+        qs = [self.select_query(g, inf_nodes)]
+        while len(qs) < k and not self.empty():
+            try:
+                qs.append(self.select_query(g, inf_nodes))
+            except NoMoreQuery:
+                break
+        return qs
+
     def _select_query(self, *args, **kwargs):
         raise NotImplementedError('do it yourself!')
 
     def update_pool(self, g):
         """some nodes might be removed from g, thus they are not selectble from self._cand_pool
         """
-        visible_nodes = set(extract_nodes(g))
-        self._cand_pool = list(set(self._cand_pool).intersection(visible_nodes))
+        self._cand_pool.intersect(visible_mask(g))
 
     def empty(self):
         return len(self._cand_pool) == 0
@@ -54,24 +79,35 @@ class RandomQueryGenerator(BaseQueryGenerator):
     """random query generator"""
 
     def _select_query(self, *args, **kwargs):
-        return random.choice(list(self._cand_pool))
+        return self._cand_pool.random_choice()
 
 
 class PRQueryGenerator(BaseQueryGenerator):
     """rank node by pagerank score
     """
-    def _update_pagerank_score(self, g, obs):
-        pers = self.g.new_vertex_property('float')
-        for o in obs:
-            pers[o] = 1 / len(obs)
-        rank = pagerank(self.g, pers=pers)
+    def __init__(self, g, *args, incremental=False, **kwargs):
+        """
+        incremental: if True, PageRank is re-computed by power iteration
+        warm-started from the previous scores, instead of from scratch by graph_tool
+        """
+        self.incremental = incremental
+        self._rank = None
+        super(PRQueryGenerator, self).__init__(g, *args, **kwargs)
 
-        self.pr = {}
-        for v in self.g.vertices():
-            self.pr[int(v)] = rank[v]
+    def _update_pagerank_score(self, g, obs):
+        obs = np.asarray(obs, dtype=np.int64)
+        if self.incremental:
+            pers = np.zeros(self.g.num_vertices(ignore_filter=True))
+            pers[obs] = 1 / len(obs)
+            self._rank = personalized_pagerank(self.g, pers, init=self._rank)
+            rank = self._rank
+        else:
+            pers = self.g.new_vertex_property('float')
+            pers.a[obs] = 1 / len(obs)
+            rank = pagerank(self.g, pers=pers).a
 
-        for o in obs:
-            self.pr[int(o)] = 0
+        self.pr = np.array(rank, dtype=np.float64)
+        self.pr[obs] = 0
 
     def receive_observation(self, obs, c):
         # personalized vector for pagerank
@@ -84,8 +120,11 @@ class PRQueryGenerator(BaseQueryGenerator):
     def update_observation(self, g, inf_nodes, node, label, c):
         self._update_pagerank_score(g, inf_nodes)
 
+    def update_observations(self, g, inf_nodes, node_labels, c):
+        self._update_pagerank_score(g, inf_nodes)
+
     def _select_query(self, *args, **kwargs):
-        return max(self._cand_pool, key=self.pr.__getitem__)
+        return int(np.argmax(np.where(self._cand_pool.mask, self.pr, -np.inf)))
 
 
 class SamplingBasedGenerator(BaseQueryGenerator):
@@ -97,11 +136,21 @@ class SamplingBasedGenerator(BaseQueryGenerator):
             root_sampler='random',
             error_estimator=None,
             root_sampler_eps=0.0,
+            compaction_threshold=None,
             **kwargs
     ):
+        """
+        compaction_threshold: float in (0, 1) or None
+            if the fraction of nodes that remain visible drops below it,
+            sampling and statistics are done on a re-indexed (smaller) subgraph,
+            None to disable
+        """
         self.sampler = sampler
         assert root_sampler in {'random', 'pagerank', 'true_root'}
 
+        self.compaction_threshold = compaction_threshold
+        self.active_subgraph = None
+
         self.root_sampler_name = root_sampler
         self.root_sampler_eps = root_sampler_eps
 
@@ -140,29 +189,64 @@ class SamplingBasedGenerator(BaseQueryGenerator):
 
     def update_observation(self, g, inf_nodes, node, label, c):
         """update the tree samples"""
+        self.update_observations(g, inf_nodes, {node: label}, c)
+
+    def update_observations(self, g, inf_nodes, node_labels, c):
+        """update the tree samples once for a batch of queries"""
         # rigorously speaking,
         # root sampler should be updated, for example
         # earliet node might be updated, or uninfected nodes get removed
         # print('update observation, self.root_sampler', self.root_sampler)
         self._update_root_sampler(inf_nodes, c)
 
+        uninf_nodes = [n for n, label in node_labels.items() if label == 0]
+        if self.active_subgraph is not None:
+            for n in uninf_nodes:
+                self.active_subgraph.observe_uninfected_node(n, inf_nodes)
+
         new_samples = self.sampler.update_samples(
             inf_nodes,
-            {node: label},
+            node_labels,
             root_sampler=self.root_sampler
         )
 
         if not self.sampler.with_resampling:
             # should be deprecated because trees are re-sampled
-            self.error_estimator.update_trees(new_samples, {node: label})
+            self.error_estimator.update_trees(new_samples, node_labels,
+                                              invalidated=self.sampler.invalidated)
         else:
             # re-build the matrix because trees are re-sampled
             self.error_estimator.build_matrix(self.sampler._samples)
 
+        if len(uninf_nodes) > 0:
+            # after the update, no tree contains the nodes that become hidden
+            self._compact_if_needed(g)
+
+    def _compact_if_needed(self, g):
+        """re-index the visible part of `g`
+        if it's smaller than `compaction_threshold` times the current (sub)graph
+        """
+        if (self.compaction_threshold is None
+            or not hasattr(self.sampler, 'set_active_subgraph')
+            or self.sampler.with_resampling):
+            return
+
+        if self.active_subgraph is None:
+            cur_size = g.num_vertices(ignore_filter=True)
+        else:
+            cur_size = self.active_subgraph.num_nodes
+
+        if g.num_vertices() < self.compaction_threshold * cur_size:
+            if self.verbose:
+                print('compacting graph from {} to {} nodes'.format(cur_size, g.num_vertices()))
+            self.active_subgraph = ActiveSubgraph(g)
+            self.sampler.set_active_subgraph(self.active_subgraph)
+            self.error_estimator.set_active_subgraph(self.active_subgraph)
+
     def prune_candidates(self):
-        self._cand_pool = set(
+        self._cand_pool.keep_only(
             self.error_estimator.filter_out_extreme_targets(
-                self._cand_pool,
+                self._cand_pool.nodes,
                 min_value=self.min_proba)
         )
 
@@ -176,12 +260,12 @@ class EntropyQueryGenerator(SamplingBasedGenerator):
     def _select_query(self, g, inf_nodes):
         # need to resample the spanning trees
         # because in theory, uninfected nodes can be removed from the graph
-        scores = uncertainty_scores(
+        scores = node_uncertainty(
             g, inf_nodes,
             self.sampler,
             self.error_estimator)
-        q = max(self._cand_pool, key=scores.__getitem__)
-        return q
+
+        return int(np.argmax(np.where(self._cand_pool.mask, scores, -np.inf)))
 
 
 class CondEntropyQueryGenerator(SamplingBasedGenerator):
@@ -189,36 +273,74 @@ class CondEntropyQueryGenerator(SamplingBasedGenerator):
     def __init__(self, *args,
                  prune_nodes=False,
                  n_node_samples=None,
+                 node_sample_rel_std=None,
+                 branch_and_bound=False,
+                 lazy=False,
                  **kwargs):
         """
         n_node_samples: number of nodes used to estimate probabilities
         pass None if using all of them.
+
+        node_sample_rel_std: if given, the number of estimation nodes is adapted in each round
+        so that the (approximate) relative std of the estimated total entropy is at most this value,
+        capped by `n_node_samples` if it's given as well.
+
+        branch_and_bound: if True, candidates are evaluated in increasing order of
+        a lower bound of their scores (`TreeBasedStatistics.query_score_lower_bound`)
+        and the selection stops once no remaining bound is below the best score.
+        `n_evaluated` records the number of exact scores computed in the last selection.
+
+        lazy: if True, scores of the previous round are kept in a priority queue,
+        only candidates whose tree occurrences changed are re-evaluated upfront,
+        the others are re-evaluated when they get to the top, until the top is fresh.
+        this is a heuristic: scores of unchanged candidates can still change.
+        `n_saved` records the number of evaluations saved in each round.
         """
         self.min_proba = kwargs.get('min_proba', 0.0)
         self.n_node_samples = n_node_samples
+        self.node_sample_rel_std = node_sample_rel_std
         self.prune_nodes = prune_nodes
+        self.branch_and_bound = branch_and_bound
+        self.lazy = lazy
+        self.n_evaluated = 0
+        self.n_saved = []
+        self.query_scores = {}
 
         super(CondEntropyQueryGenerator, self).__init__(*args, **kwargs)
+        if self.lazy:
+            self.error_estimator.track_changes = True
 
     def _sample_nodes_for_estimation(self):
-        # use node samples to estimate prediction error
-        cand_node_samples = list(self._cand_pool)
+        """
+        sample estimation nodes without replacement,
+        with inclusion probability proportional to min(p, 1-p) (capped at 1),
+        p being the infection probability.
 
-        node_sample_inf_proba = self.error_estimator.unconditional_proba(cand_node_samples)
-        # node_sample_inf_proba = np.array(
-        #     [len(matching_trees(self.sampler.samples, n, 1)) / len(self.sampler.samples)
-        #      for n in cand_node_samples])
+        nodes with p = 0 or 1 are never sampled, their (conditional) entropy is zero anyway
+
+        Returns:
+
+        - the sampled nodes
+        - their weights (inverse inclusion probabilities),
+          so that weighted sums over them are unbiased estimates of sums over all candidates
+        """
+        cand_node_samples = np.array(self._cand_pool.nodes)
 
+        node_sample_inf_proba = self.error_estimator.unconditional_proba(cand_node_samples)
         # the closer to 0.5, the better
-        val1 = node_sample_inf_proba * 2
-        val2 = (1 - node_sample_inf_proba) * 2
-        sampling_weight = np.where(val1 < val2, val1, val2)  # take the pairwise minimum
-        assert (sampling_weight <= 1).all()
+        sampling_weight = np.minimum(node_sample_inf_proba, 1 - node_sample_inf_proba)
 
-        sampling_weight /= sampling_weight.sum()
+        n_samples = self.n_node_samples
+        if self.node_sample_rel_std is not None:
+            n_samples = sample_size_for_rel_std(
+                sampling_weight,
+                self.error_estimator.node_level_entropy(cand_node_samples),
+                self.node_sample_rel_std,
+                max_size=n_samples)
 
-        return np.random.choice(cand_node_samples, self.n_node_samples,
-                                p=sampling_weight)
+        proba = inclusion_proba(sampling_weight, n_samples)
+        indices = systematic_sample(proba)
+        return cand_node_samples[indices], 1 / proba[indices]
 
     def _prepare_for_selection(self, inf_nodes):
         if self.prune_nodes:
@@ -235,48 +357,164 @@ class CondEntropyQueryGenerator(SamplingBasedGenerator):
         elif self.verbose:
             print('there is no candidate pruning: #candidates={}'.format(len(self._cand_pool)))
 
-        if ((self.n_node_samples is None) or self.n_node_samples >= len(self._cand_pool)):
+        if (((self.n_node_samples is None) and (self.node_sample_rel_std is None))
+                or (self.n_node_samples is not None and self.n_node_samples >= len(self._cand_pool))):
 
             if self.verbose:
                 print('no estimation node sampling')
 
-            self.node_samples = self._cand_pool
+            self.node_samples = np.array(self._cand_pool.nodes)
+            self.node_sample_weights = None
         else:
-            self.node_samples = self._sample_nodes_for_estimation()
+            self.node_samples, self.node_sample_weights = self._sample_nodes_for_estimation()
 
             if self.verbose:
-                print('number of estimation nodes'.format(len(self.node_samples)))
+                print('number of estimation nodes: {}'.format(len(self.node_samples)))
+
+    def _estimation_targets(self, queries):
+        """estimation nodes other than `queries` and their weights (None if equally weighted)"""
+        keep = ~np.isin(self.node_samples, queries)
+        if self.node_sample_weights is None:
+            return self.node_samples[keep], None
+        return self.node_samples[keep], self.node_sample_weights[keep]
 
     # @profile
     def _select_query(self, g, inf_nodes, return_verbose=False):
         self._prepare_for_selection(inf_nodes)
 
         def score(q):
-            nodes = set(self.node_samples) - {q}
+            nodes, weights = self._estimation_targets([q])
             if len(nodes) == 0:
                 return float('inf')  # throw this node away
             else:
                 return self.error_estimator.query_score(
-                    q, nodes, return_verbose=return_verbose)
+                    q, nodes, node_weights=weights, return_verbose=return_verbose)
 
         q2score = {}
         self.aux = {}
-        # for q in tqdm(self._cand_pool)
-        for q in self._cand_pool:
+
+        def evaluate(q):
             if return_verbose:
-                q2score[q], other_stuff = score(q)
-                self.aux[q] = other_stuff
+                q2score[q], self.aux[q] = score(q)
             else:
                 q2score[q] = score(q)
+            return q2score[q]
 
         if len(self._cand_pool) == 0:
             raise NoMoreQuery
 
-        best_q = min(self._cand_pool, key=q2score.__getitem__)
-        self.query_scores = q2score
+        stale_scores = {}
+        if self.branch_and_bound:
+            best_q = self._select_by_branch_and_bound(evaluate)
+        elif self.lazy:
+            best_q, stale_scores = self._select_lazily(evaluate)
+        else:
+            # for q in tqdm(self._cand_pool)
+            for q in self._cand_pool:
+                evaluate(q)
+            best_q = min(self._cand_pool, key=q2score.__getitem__)
+
+        self.n_evaluated = len(q2score)
+        self.query_scores = {**stale_scores, **q2score}
         # print('best_q', best_q)
         return best_q
 
+    def select_queries(self, g, inf_nodes, k):
+        """greedy batch selection:
+        the i-th query minimizes the objective conditioned on the joint outcome of the first i queries,
+        using the same tree samples
+        """
+        if k == 1:
+            return [self.select_query(g, inf_nodes)]
+        if len(self._cand_pool) == 0:
+            raise NoMoreQuery()
+
+        self._prepare_for_selection(inf_nodes)
+        if len(self._cand_pool) == 0:
+            raise NoMoreQuery()
+
+        batch_score = self._batch_objective(g, inf_nodes)
+        qs = []
+        while len(qs) < k:
+            cands = [q for q in self._cand_pool if q not in qs]
+            if len(cands) == 0:
+                break
+
+            q2score = {}
+            for q in cands:
+                targets, weights = self._estimation_targets(qs + [q])
+                if len(targets) == 0:
+                    q2score[q] = float('inf')  # throw this node away
+                else:
+                    q2score[q] = batch_score(qs + [q], targets, weights)
+            qs.append(min(cands, key=q2score.__getitem__))
+
+        for q in qs:
+            self._cand_pool.remove(q)
+        return qs
+
+    def _batch_objective(self, g, inf_nodes):
+        """returns function (queries, targets, target weights) -> score, the lower the better"""
+        def score(queries, targets, weights):
+            return self.error_estimator.batch_query_score(queries, targets, node_weights=weights)
+        return score
+
+    def _select_lazily(self, evaluate):
+        """
+        Returns:
+
+        - the best query
+        - scores carried over from previous rounds (not re-evaluated)
+        """
+        def priority(score):
+            return float('inf') if np.isnan(score) else score
+
+        changed = set(self.error_estimator.pop_changed_nodes())
+        heap = []
+        for q in self._cand_pool:
+            if q in self.query_scores and q not in changed:
+                heap.append((priority(self.query_scores[q]), False, q))
+            else:
+                heap.append((priority(evaluate(q)), True, q))
+        heapq.heapify(heap)
+
+        while True:
+            score, fresh, q = heapq.heappop(heap)
+            if fresh:
+                break
+            heapq.heappush(heap, (priority(evaluate(q)), True, q))
+
+        stale_scores = {q: score for score, fresh, q in heap if not fresh}
+        self.n_saved.append(len(stale_scores))
+        if self.verbose:
+            print('lazy evaluation saved {} out of {} evaluations'.format(
+                len(stale_scores), len(self._cand_pool)))
+        return q, stale_scores
+
+    def _select_by_branch_and_bound(self, evaluate):
+        cands = list(self._cand_pool)
+        bounds = self.error_estimator.query_score_lower_bound(
+            cands, self.node_samples, node_weights=self.node_sample_weights)
+
+        best_q, best_score = None, float('inf')
+        n_evaluated = 0
+        for i in np.argsort(bounds, kind='stable'):
+            if bounds[i] >= best_score:
+                # no remaining candidate can be better
+                break
+            s = evaluate(cands[i])
+            n_evaluated += 1
+            if s < best_score:
+                best_q, best_score = cands[i], s
+
+        if self.verbose:
+            print('evaluated {} out of {} candidates'.format(n_evaluated, len(cands)))
+
+        if best_q is None:
+            # no finite score
+            best_q = cands[int(np.argmin(bounds))]
+        return best_q
+
 
 class MutualInformationQueryGenerator(CondEntropyQueryGenerator):
     """
@@ -294,61 +532,98 @@ class MutualInformationQueryGenerator(CondEntropyQueryGenerator):
     def _select_query(self, g, inf_nodes):
         self._prepare_for_selection(inf_nodes)
 
-        def score(q):
-            nodes = set(self.node_samples) - {q}
-            if len(nodes) == 0:
-                return float('inf')  # throw this node away
-            else:
-                return self.error_estimator.query_score(
-                    q, nodes,
-                    node_weights='uncond_proba',
-                    return_verbose=False)
+        if len(self._cand_pool) == 0:
+            raise NoMoreQuery
 
-        q2score = {}
+        entropy_scores, uncond_proba = self._round_statistics(g, inf_nodes)
 
-        # entropy scores
-        entropy_scores = uncertainty_scores(
+        cands = np.array(self._cand_pool.nodes)
+        targets = self.node_samples
+        node_weights = self._target_weights(uncond_proba, targets, self.node_sample_weights)
+
+        # conditional entropy scores of all candidates at once
+        scores = self.error_estimator.query_scores(cands, targets, node_weights=node_weights)
+        scores += entropy_scores[cands]  # shouldn't it be -score(q)?
+        # throw away nodes that are the only target
+        scores[len(targets) - np.isin(cands, targets) == 0] = float('inf')
+
+        self.query_scores = dict(zip(cands.tolist(), scores.tolist()))
+        best_q = min(self._cand_pool, key=self.query_scores.__getitem__)
+
+        return best_q
+
+    def _round_statistics(self, g, inf_nodes):
+        """node entropy and unconditional infection probability,
+        both indexed by node id, computed once per round"""
+        entropy_scores = node_uncertainty(
             g, inf_nodes,
             self.sampler,
             self.error_estimator)
+        return entropy_scores, self.error_estimator.unconditional_proba()
 
-        # conditional entropy scores
-        for q in self._cand_pool:
-            q2score[q] = score(q) + entropy_scores[q]  # shouldn't it be -score(q)?
-
-        if len(self._cand_pool) == 0:
-            raise NoMoreQuery
+    @staticmethod
+    def _target_weights(uncond_proba, targets, weights):
+        node_weights = uncond_proba[targets]
+        if weights is not None:
+            node_weights = node_weights * weights
+        return node_weights
 
-        best_q = min(self._cand_pool, key=q2score.__getitem__)
-        self.query_scores = q2score
+    def _batch_objective(self, g, inf_nodes):
+        entropy_scores, uncond_proba = self._round_statistics(g, inf_nodes)
 
-        return best_q
+        def score(queries, targets, weights):
+            # entropy of the earlier queries is the same for all candidates
+            return self.error_estimator.batch_query_score(
+                queries, targets,
+                node_weights=self._target_weights(uncond_proba, targets, weights)
+            ) + entropy_scores[queries[-1]]
+        return score
 
 
-class LatestFirstOracle(BaseQueryGenerator):
+class InfectionOrderOracle(BaseQueryGenerator):
     """
-    query strategy that has access to an oracle.
-    it queries *latest* infection first
+    query strategy that has access to an oracle,
+    it queries infected nodes in a fixed order of infection time
+
+    the order is computed once per observation,
+    candidates removed from the pool are skipped, so each query is amortized O(1)
     """
+    def receive_observation(self, obs, c):
+        super().receive_observation(obs, c)
+        self._order = self._infection_order(np.asarray(c))
+        self._cursor = 0
+
+    def _infection_order(self, c):
+        """all nodes sorted by query priority, uninfected ones being the last"""
+        raise NotImplementedError('do it yourself!')
+
     def _select_query(self, *args, **kwargs):
-        n = max(self._cand_pool, key=lambda n: self.c[n])
+        while (self._cursor < len(self._order)
+               and self._order[self._cursor] not in self._cand_pool):
+            self._cursor += 1
+        if self._cursor == len(self._order):
+            raise NoMoreQuery
+
+        n = int(self._order[self._cursor])
         if self.c[n] >= 0:
             return n
         else:
             raise NoMoreQuery
 
 
-class EarliestFirstOracle(BaseQueryGenerator):
+class LatestFirstOracle(InfectionOrderOracle):
+    """
+    query strategy that has access to an oracle.
+    it queries *latest* infection first
+    """
+    def _infection_order(self, c):
+        return np.argsort(-c, kind='stable')
+
+
+class EarliestFirstOracle(InfectionOrderOracle):
     """
     query strategy that has access to an oracle.
     it queries *earliest* infection first
     """
-    def _select_query(self, *args, **kwargs):
-        max_val = self.c.max() + 1
-        n = min(self._cand_pool, key=lambda n: (self.c[n]
-                                                if self.c[n] >= 0
-                                                else max_val))
-        if self.c[n] >= 0:
-            return n
-        else:
-            raise NoMoreQuery
+    def _infection_order(self, c):
+        return np.argsort(np.where(c >= 0, c, np.inf), kind='stable')
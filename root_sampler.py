@@ -9,12 +9,22 @@ def build_earlier_root_sampler(g, obs, c, **kwargs):
     return f
 
 
-def build_early_nbrs_sampler(g, obs, c, k=1, **kwargs):
+def build_early_nbrs_sampler(g, obs, c, k=1, batch_size=1000, csr=None, **kwargs):
+    """sample uniformly from the earliest observed node and its `k`-hop neighbours,
+
+    the neighbours are found by BFS, over `csr` (a cached `CSRGraph` of `g`) if given,
+    otherwise over `g`,
+    roots are drawn `batch_size` at a time
+    """
     earliest_node = min(obs, key=lambda o: c[o])
-    nbrs = list(k_hop_neighbors(earliest_node, g, k=k)) + [earliest_node]
+    nbrs = k_hop_neighbors(earliest_node, g if csr is None else csr, k=k).tolist() + [earliest_node]
+    batch = []
 
     def f():
-        return random.choice(nbrs)
+        if len(batch) == 0:
+            # `random`, so that `random.seed` controls the roots as before
+            batch.extend(random.choices(nbrs, k=batch_size))
+        return batch.pop()
     return f
 
 
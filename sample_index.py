@@ -0,0 +1,60 @@
+import numpy as np
+
+
+def _bit(slots):
+    return np.left_shift(np.uint64(1), (slots & 63).astype(np.uint64))
+
+
+class SampleIndex():
+    """
+    node -> sample bitmap, for filtering samples by node labels
+
+    - `_bits[n]`: bit `i` is set if node `n` is in the sample at slot `i`
+
+    filtering is a few bitwise AND/ANDNOT over words,
+    updating touches only the nodes of the samples being replaced
+    """
+    def __init__(self, num_nodes, n_samples):
+        self.num_nodes = num_nodes
+        self.n_samples = n_samples
+        self.n_words = (n_samples + 63) // 64
+        self._bits = np.zeros((num_nodes, self.n_words), dtype=np.uint64)
+
+    def _coords(self, slots, samples):
+        samples = [np.fromiter(s, dtype=np.int64, count=len(s)) for s in samples]
+        lengths = [len(s) for s in samples]
+        cols = np.repeat(np.asarray(slots, dtype=np.int64), lengths)
+        if len(cols) == 0:
+            return np.zeros(0, dtype=np.int64), cols, np.zeros(0, dtype=np.uint64)
+        return np.concatenate(samples), cols >> 6, _bit(cols)
+
+    def add(self, slots, samples):
+        """samples: list of set of ints, the i-th one being at slot `slots[i]`"""
+        rows, words, bits = self._coords(slots, samples)
+        np.bitwise_or.at(self._bits, (rows, words), bits)
+
+    def remove(self, slots, samples):
+        """samples: those that were added to `slots`"""
+        rows, words, bits = self._coords(slots, samples)
+        np.bitwise_and.at(self._bits, (rows, words), ~bits)
+
+    def build(self, samples):
+        self._bits[:] = 0
+        self.add(np.arange(len(samples)), samples)
+
+    def matching(self, node_values):
+        """
+        node_values: dict of node -> label (1: infected, 0: uninfected)
+
+        Returns:
+
+        boolean array over slots, True if the sample agrees with all labels
+        """
+        mask = np.full(self.n_words, np.iinfo(np.uint64).max, dtype=np.uint64)
+        for n, v in node_values.items():
+            if v == 1:
+                mask &= self._bits[n]
+            else:
+                mask &= ~self._bits[n]
+        slots = np.arange(self.n_samples)
+        return ((mask[slots >> 6] >> (slots & 63).astype(np.uint64)) & np.uint64(1)).astype(bool)
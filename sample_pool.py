@@ -8,7 +8,11 @@ from graph_helpers import (
     filter_graph_by_edges,
     extract_nodes_from_tuples
 )
-from proba_helpers import tree_probability_gt, ic_cascade_probability_gt
+from proba_helpers import (
+    cascade_probability_gt,
+    ic_cascade_probability_gt,
+    LogProbaTables
+)
 from core import (
     sample_by_simulation,
     sample_by_mst_plus_simulation,
@@ -16,10 +20,38 @@ from core import (
     sample_by_reverse_reachable_set,
     SIMULATION_METHODS
 )
-from core1 import matching_trees
+from sample_index import SampleIndex
 from helpers import infected_nodes
 
 
+# cascade probability functions -> the `LogProbaTables` method doing the same on a batch
+VECTORIZED_PROBA_FUNCS = {
+    cascade_probability_gt: 'cascade_log_proba',
+    ic_cascade_probability_gt: 'ic_cascade_log_proba'
+}
+
+
+def replace_samples(samples, index, slots, new_samples, nodes_of=None):
+    """
+    replace `samples[slots]` by `new_samples`, keeping `index` (a `SampleIndex`) in sync
+
+    nodes_of: function that returns the node set of a sample (identity if None)
+
+    Returns:
+
+    the new list of samples (`samples` is not modified)
+    """
+    if nodes_of is None:
+        def nodes_of(t):
+            return t
+    samples = list(samples)
+    index.remove(slots, [nodes_of(samples[i]) for i in slots])
+    for i, t in zip(slots, new_samples):
+        samples[i] = t
+    index.add(slots, [nodes_of(t) for t in new_samples])
+    return samples
+
+
 class TreeSamplePool():
     def __init__(self, g, n_samples, method,
                  gi=None,
@@ -28,12 +60,19 @@ class TreeSamplePool():
                  return_type='nodes'):
         assert return_type in {'nodes', 'tuples'}, 'invalid return_type {}'.format(return_type)
         self.g = g
-        self.num_nodes = g.num_vertices()  # fixed
+        self.num_nodes = g.num_vertices(ignore_filter=True)  # fixed
         self.n_samples = n_samples
         self.gi = gi
         self.method = method
         self.return_type = return_type
         self._samples = []
+        self.active_subgraph = None
+
+        # node -> sample bitmap over `_samples`
+        self._index = SampleIndex(self.num_nodes, n_samples)
+        # samples replaced in the last update (boolean array over sample positions),
+        # replaced samples keep their positions
+        self.invalidated = None
 
         self.true_casacde_proba_func = true_casacde_proba_func
         self.with_resampling = with_resampling
@@ -42,25 +81,59 @@ class TreeSamplePool():
             # needs to return edge tuples
             self._internal_return_type = 'tuples'
             self.p = None
-            self.g_nx = None
-            self.p_dict = None
+            self.proba_tables = None
         else:
             self._internal_return_type = return_type
 
-    def fill(self, obs, **kwargs):
-        self._samples = sample_steiner_trees(
-            self.g, obs,
+    def set_active_subgraph(self, active_subgraph):
+        """sample on `active_subgraph` (an `ActiveSubgraph`) from now on,
+        samples are still in original node ids
+        """
+        assert self._internal_return_type == 'nodes', 'only works for return_type=nodes'
+        self.active_subgraph = active_subgraph
+
+    def _sample(self, obs, n_samples, **kwargs):
+        if self.active_subgraph is None:
+            return sample_steiner_trees(
+                self.g, obs,
+                method=self.method,
+                n_samples=n_samples,
+                return_type=self._internal_return_type,
+                gi=self.gi,
+                **kwargs)
+
+        # sample on the smaller graph and translate back
+        a = self.active_subgraph
+        root_sampler = kwargs.pop('root_sampler', None)
+        if root_sampler is not None:
+            def new_root_sampler():
+                r = int(a.o2n[root_sampler()])
+                assert r >= 0, 'root is not in the active subgraph'
+                return r
+            kwargs['root_sampler'] = new_root_sampler
+
+        samples = sample_steiner_trees(
+            a.g, list(map(int, a.to_new(list(obs)))),
             method=self.method,
-            n_samples=self.n_samples,
+            n_samples=n_samples,
             return_type=self._internal_return_type,
-            gi=self.gi,
+            gi=a.gi,
             **kwargs)
+        return [set(map(int, a.to_old(list(t)))) for t in samples]
+
+    def _nodes_of(self, t):
+        if self._internal_return_type == 'tuples':
+            return extract_nodes_from_tuples(t)
+        return t
+
+    def fill(self, obs, **kwargs):
+        self._samples = self._sample(obs, self.n_samples, **kwargs)
 
         if self.with_resampling:
             print('DEBUG: TreeSamplePool.with_resampling=', self.with_resampling)
             self._old_samples = self._samples
             self._samples = self.resample_trees(self._samples)
-
+        self._index.build(list(map(self._nodes_of, self._samples)))
 
     # @profile
     def update_samples(self, inf_nodes, node_update_info, **kwargs):
@@ -73,38 +146,25 @@ class TreeSamplePool():
         for n, label in node_update_info.items():
             assert label in {0, 1}  # 0: uninfected, 1: infected
 
-        if self._internal_return_type == 'tuples':
-            def valid(t):
-                nodes = extract_nodes_from_tuples(t)
-                for n, label in node_update_info.items():
-                    if label == 1:
-                        if n not in nodes:
-                            return False
-                    else:
-                        if n in nodes:
-                            return False
-                return True
-
-            valid_samples = [t for t in self._samples if valid(t)]
-        elif self.return_type == 'nodes':
-            valid_samples = matching_trees(self._samples, node_update_info)
-
-        # print('num. valid_samples: {}'.format(len(valid_samples)))
-        new_samples = sample_steiner_trees(
-            self.g, inf_nodes,
-            method=self.method,
-            n_samples=self.n_samples - len(valid_samples),
-            return_type=self._internal_return_type,
-            gi=self.gi,
+        self.invalidated = ~self._index.matching(node_update_info)
+        invalid_slots = np.nonzero(self.invalidated)[0]
+
+        # print('num. valid_samples: {}'.format(self.n_samples - len(invalid_slots)))
+        new_samples = self._sample(
+            inf_nodes,
+            len(invalid_slots),
             **kwargs)
 
-        self._samples = valid_samples + new_samples
+        self._samples = replace_samples(self._samples, self._index,
+                                        invalid_slots, new_samples,
+                                        nodes_of=self._nodes_of)
 
         assert len(self._samples) == self.n_samples
 
         if self.with_resampling:
             self._old_samples = self._samples
             self._samples = self.resample_trees(self._samples)
+            self._index.build(list(map(self._nodes_of, self._samples)))
 
         # only useful if re-sampling is NOT enabled
         return new_samples
@@ -127,31 +187,27 @@ class TreeSamplePool():
         return len(self._samples) == 0
 
     def resample_trees(self, trees):
-        possible_trees = list(set(trees))
-
         self.p = get_edge_weights(self.g)
-
-        # this is required for speed
-        # graph_tool's out_neighbours is slow
-        self.g_nx = nx.DiGraph()
-        for e in self.g.edges():
-            self.g_nx.add_edge(int(e.source()), int(e.target()))
-
-        self.p_dict = {tuple(map(int, [e.source(), e.target()])): self.p[e]
-                       for e in self.g.edges()}
-
-        out_degree = self.g.degree_property_map('out', weight=self.p)
-        out_degree_dict = {int(v): out_degree[v] for v in self.g.vertices()}
+        # re-built every time as the graph might have changed since last call
+        self.proba_tables = LogProbaTables(self.g, self.p)
 
         # caching table
         # and we work in the log domain
-        log_p_tbl = {t: self.true_casacde_proba_func(self.g, self.p_dict, t, self.g_nx, using_log=True)
-                     for t in possible_trees}
-        log_pi_tbl = {t: tree_probability_gt(out_degree_dict, self.p_dict, t, using_log=True)
-                      for t in possible_trees}
+        possible_trees = list(set(trees))
+        tree_idx = {t: i for i, t in enumerate(possible_trees)}
+        rows, lengths = self.proba_tables.batch_rows(possible_trees)
 
-        log_p_T = np.array([log_p_tbl[t] for t in trees])
-        log_pi_T = np.array([log_pi_tbl[t] for t in trees])
+        # all unique trees are evaluated in one call
+        vectorized_func = VECTORIZED_PROBA_FUNCS.get(self.true_casacde_proba_func)
+        if vectorized_func is not None:
+            log_p_tbl = getattr(self.proba_tables, vectorized_func)(rows, lengths)
+        else:
+            log_p_tbl = self._log_cascade_probas_one_by_one(possible_trees)
+        log_pi_tbl = self.proba_tables.tree_log_proba(rows, lengths)
+
+        idx = np.array([tree_idx[t] for t in trees], dtype=np.int64)
+        log_p_T = log_p_tbl[idx]
+        log_pi_T = log_pi_tbl[idx]
 
         sampling_weights = np.exp(log_p_T - log_pi_T)  # back to probabiliy
 
@@ -173,6 +229,19 @@ class TreeSamplePool():
         self._sampling_weights = sampling_weights
         return resampled_trees
 
+    def _log_cascade_probas_one_by_one(self, trees):
+        """fallback for `true_casacde_proba_func` without a vectorized version"""
+        # this is required for speed
+        # graph_tool's out_neighbours is slow
+        g_nx = nx.DiGraph()
+        p_dict = {}
+        for e in self.g.edges():
+            u, v = int(e.source()), int(e.target())
+            g_nx.add_edge(u, v)
+            p_dict[(u, v)] = self.p[e]
+        return np.array([self.true_casacde_proba_func(self.g, p_dict, t, g_nx, using_log=True)
+                         for t in trees])
+
 
 class SimulatedCascadePool():
     def __init__(
@@ -198,11 +267,17 @@ class SimulatedCascadePool():
         self.approach = approach
         
         self.g = g
-        self.num_nodes = g.num_vertices()
+        self.num_nodes = g.num_vertices(ignore_filter=True)
         self.n_samples = n_samples
         self._cascade_params = cascade_params
         self._samples = []  # a list of sets of integers
 
+        # node -> sample bitmap over `_samples`
+        self._index = SampleIndex(self.num_nodes, n_samples)
+        # samples replaced in the last update (boolean array over sample positions),
+        # replaced samples keep their positions
+        self.invalidated = None
+
         self.cascade_model = cascade_model
 
         # for downstream compatibility
@@ -240,6 +315,7 @@ class SimulatedCascadePool():
         
     def fill(self, obs, **kwargs):
         self._samples = self._gen_n_samples(obs, self.n_samples, **kwargs)
+        self._index.build(self._samples)
 
     def update_samples(self, inf_nodes, node_update_info, **kwargs):
         """
@@ -254,15 +330,17 @@ class SimulatedCascadePool():
         for n, label in node_update_info.items():
             assert label in {0, 1}  # 0: uninfected, 1: infected
 
-        valid_samples = matching_trees(self._samples, node_update_info)
+        self.invalidated = ~self._index.matching(node_update_info)
+        invalid_slots = np.nonzero(self.invalidated)[0]
 
-        # print('num. valid_samples: {}'.format(len(valid_samples)))
+        # print('num. valid_samples: {}'.format(self.n_samples - len(invalid_slots)))
         new_samples = self._gen_n_samples(
             obs=inf_nodes,
-            n=self.n_samples - len(valid_samples)
+            n=len(invalid_slots)
         )
 
-        self._samples = valid_samples + new_samples
+        self._samples = replace_samples(self._samples, self._index,
+                                        invalid_slots, new_samples)
 
         assert len(self._samples) == self.n_samples
         # print('#new_samples=', len(new_samples))
@@ -22,7 +22,9 @@ extensions = [
     Extension(
         'core1', ['core1.pyx'],
         language=LANG,
-        libraries=["m"]
+        libraries=["m"],
+        extra_compile_args=['-fopenmp'],
+        extra_link_args=['-fopenmp']
     ),
     Extension(
         'si', ['si.pyx'],
@@ -29,7 +29,7 @@ cpdef si_opt(g, p, source=None, infected=None, float min_fraction=0.0, float max
     max_fraction: stopping if more than N x max_fraction nodes are infected
 
     """
-    cdef float N = <float> g.num_vertices()
+    cdef float N = <float> g.num_vertices(ignore_filter=True)
     cdef bool weighted = False, stop = False
     cdef int time = 0
     cdef int i, j
@@ -42,7 +42,7 @@ cpdef si_opt(g, p, source=None, infected=None, float min_fraction=0.0, float max
         assert 0 < p and p <= 1
 
     if source is None and infected is None:
-        source = random.choice(np.arange(g.num_vertices()))
+        source = random.choice(np.arange(g.num_vertices(ignore_filter=True)))
 
     if infected is None:
         infected = {source}
@@ -50,11 +50,11 @@ cpdef si_opt(g, p, source=None, infected=None, float min_fraction=0.0, float max
         raise_if_not_iterable(infected)
         infected = set(infected)
         # check size
-        cascade_fraction = len(infected) / g.num_vertices()
+        cascade_fraction = len(infected) / g.num_vertices(ignore_filter=True)
         if cascade_fraction > max_fraction:
             raise TooManyInfections
 
-    infection_times = np.ones(g.num_vertices()) * -1
+    infection_times = np.ones(g.num_vertices(ignore_filter=True)) * -1
     infection_times[list(infected)] = 0
 
     edges = []
@@ -105,7 +105,7 @@ cpdef si_opt(g, p, source=None, infected=None, float min_fraction=0.0, float max
             break
 
     tree = Graph(directed=True)
-    tree.add_vertex(g.num_vertices())
+    tree.add_vertex(g.num_vertices(ignore_filter=True))
     tree.add_edge_list(edges)
 
     return source, infection_times, tree
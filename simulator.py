@@ -1,6 +1,5 @@
 from tqdm import tqdm
-from graph_helpers import observe_uninfected_node
-from random_steiner_tree.util import isolate_vertex
+from observation_state import ObservationState
 from cascade_generator import gen_input
 from query_selection import NoMoreQuery
 
@@ -15,6 +14,7 @@ class Simulator():
         self.gi = gi
         self.q_gen = query_generator
         self.print_log = print_log
+        self.state = ObservationState(g, gi)
 
     def run(self,
             n_queries,
@@ -22,9 +22,13 @@ class Simulator():
             c=None,
             gen_input_kwargs={},
             iter_callback=None,
-            force_receive_obs=False
+            force_receive_obs=False,
+            batch_size=1
     ):
         """return the list of query nodes
+
+        batch_size: number of nodes queried per round,
+            the query generator is updated once per round
         """
         if obs is None or c is None:
             obs, c = gen_input(self.g, **gen_input_kwargs)[:2]
@@ -38,59 +42,77 @@ class Simulator():
         qs = []
         inf_nodes = list(obs)
         uninf_nodes = []
-        
+
         if self.print_log:
-            iters = tqdm(range(n_queries), total=n_queries)
-        else:
-            iters = range(n_queries)
+            pbar = tqdm(total=n_queries)
 
-        for i in iters:
+        i = 0
+        while len(qs) < n_queries:
             if self.print_log:
                 print('iteration #{}'.format(i))
+            i += 1
 
+            k = min(batch_size, n_queries - len(qs))
             try:
-                q = self.q_gen.select_query(self.g, inf_nodes)
+                batch = self.q_gen.select_queries(self.g, inf_nodes, k)
             except NoMoreQuery:
                 if self.print_log:
                     print('no more nodes to query. queried {} nodes'.format(len(qs)))
                 break
 
-            # print('query:', q)
-            qs.append(q)
+            if len(batch) == 0:
+                if self.print_log:
+                    print('no more nodes to query. queried {} nodes'.format(len(qs)))
+                break
+
+            # print('query:', batch)
+            qs += batch
+            if self.print_log:
+                pbar.update(len(batch))
 
             if len(qs) == n_queries:
-                print('num. queries reached')
-                break
-            
-            if c[q] == -1:  # not infected
                 if self.print_log:
-                    print('query {} is uninfected'.format(q))
+                    print('num. queries reached')
+                break
 
-                observe_uninfected_node(self.g, q, inf_nodes)
-                if self.gi is not None:
-                    isolate_vertex(self.gi, q)
+            node_labels = {}
+            for q in batch:
+                label = int(c[q] >= 0)
+                assert label in {0, 1}
+                node_labels[q] = label
 
-                if self.print_log:
-                    print('isolated node {}'.format(q))
+            # infected nodes first,
+            # so that their components are not hidden when isolating the uninfected ones
+            for q in batch:
+                if node_labels[q] == 1:
+                    if self.print_log:
+                        print('query {} is infected'.format(q))
+                    inf_nodes.append(q)
+
+            for q in batch:
+                if node_labels[q] == 0:  # not infected
+                    if self.print_log:
+                        print('query {} is uninfected'.format(q))
+
+                    self.state.observe_uninfected_node(q, inf_nodes)
+
+                    if self.print_log:
+                        print('isolated node {}'.format(q))
 
+                    aux['graph_changed'] = True
+                    uninf_nodes.append(q)
+
+            if any(label == 0 for label in node_labels.values()):
                 self.q_gen.update_pool(self.g)
-                aux['graph_changed'] = True
-                uninf_nodes.append(q)
-            else:
-                if self.print_log:
-                    print('query {} is infected'.format(q))
-                inf_nodes.append(q)
 
             # update tree samples if necessary
             if self.print_log:
                 print('update samples started')
                 pass
 
-            label = int(c[q] >= 0)
-            assert label in {0, 1}
-            # print('update samples, node {} label {}'.format(q, label))
+            # print('update samples, labels {}'.format(node_labels))
             try:
-                self.q_gen.update_observation(self.g, inf_nodes, q, label, c)
+                self.q_gen.update_observations(self.g, inf_nodes, node_labels, c)
             except NoMoreQuery:
                 print('no more queries')
                 break
@@ -100,5 +122,7 @@ class Simulator():
 
             if callable(iter_callback):
                 iter_callback(self.g, self.q_gen, inf_nodes, uninf_nodes)
-            
+
+        if self.print_log:
+            pbar.close()
         return qs, aux
@@ -0,0 +1,48 @@
+import numpy as np
+from numpy.testing import assert_array_equal as assert_eq_np, assert_almost_equal
+
+from fixture import g
+from graph_helpers import remove_filters, get_edge_weights
+from random_steiner_tree.util import from_gt
+from active_subgraph import ActiveSubgraph
+from sample_pool import TreeSamplePool
+from tree_stat import TreeBasedStatistics
+
+
+def test_active_subgraph(g):
+    g = remove_filters(g)
+    hidden = np.arange(90, 100)  # the last row of the lattice
+    g.get_vertex_filter()[0].a[hidden] = False
+    visible = np.arange(90)
+
+    a = ActiveSubgraph(g)
+    assert a.num_nodes == len(visible)
+    assert a.g.num_vertices() == len(visible)
+    assert_eq_np(a.to_old(a.to_new(visible)), visible)
+    assert (a.to_new(hidden) == -1).all()
+
+    pool = TreeSamplePool(g, n_samples=20, method='loop_erased',
+                          gi=from_gt(g, get_edge_weights(g)),
+                          return_type='nodes')
+    pool.set_active_subgraph(a)
+    obs = [0, 45, 89]
+    pool.fill(obs)
+
+    # samples are in original ids
+    for t in pool.samples:
+        assert set(obs) <= t
+        assert t <= set(visible)
+
+    stat = TreeBasedStatistics(g, pool.samples)
+    expected = stat.unconditional_proba()
+    stat.set_active_subgraph(a)
+    proba = stat.unconditional_proba()
+    assert len(proba) == g.num_vertices(ignore_filter=True)
+    assert_eq_np(proba, expected)
+    assert (proba[obs] == 1).all()
+    assert (proba[hidden] == 0).all()
+
+    # hidden nodes are in no tree
+    assert_eq_np(stat.count(0, 1, hidden), np.zeros(len(hidden)))
+    q, targets = 1, [2, 3, 91]
+    assert_almost_equal(stat.query_scores([q], targets), [stat.query_score(q, targets)])
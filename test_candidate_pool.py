@@ -0,0 +1,39 @@
+import random
+import pytest
+import numpy as np
+
+from candidate_pool import CandidatePool
+
+
+def test_candidate_pool():
+    pool = CandidatePool([True, False, True, True, True])
+    assert len(pool) == 4
+    assert set(pool) == {0, 2, 3, 4}
+    assert 1 not in pool
+
+    pool.remove(0)
+    assert len(pool) == 3
+    assert set(pool) == {2, 3, 4}
+    assert list(pool.mask) == [False, False, True, True, True]
+
+    with pytest.raises(KeyError):
+        pool.remove(0)
+
+    pool.intersect(np.array([True, True, True, False, True]))
+    assert set(pool) == {2, 4}
+
+    pool.keep_only([4, 1])
+    assert set(pool) == {4}
+    assert pool.random_choice() == 4
+
+    pool.remove(4)
+    assert len(pool) == 0
+    assert list(pool.nodes) == []
+
+
+def test_random_choice_seeded_by_random():
+    pool = CandidatePool(np.ones(100, dtype=bool))
+    random.seed(42)
+    first = [pool.random_choice() for _ in range(10)]
+    random.seed(42)
+    assert [pool.random_choice() for _ in range(10)] == first
@@ -3,7 +3,7 @@ import random
 import numpy as np
 
 from copy import copy
-from core import uncertainty_scores, sample_steiner_trees
+from core import uncertainty_scores, node_uncertainty, sample_steiner_trees
 from sample_pool import TreeSamplePool
 from graph_helpers import is_steiner_tree
 from tree_stat import TreeBasedStatistics
@@ -25,8 +25,10 @@ def test_uncertainty_scores(g, gi, obs, sampling_method):
         for o in obs:
             scores[o]
     remain_nodes = set(np.arange(g.num_vertices())) - set(obs)
+    uncert = node_uncertainty(g, obs, sampler, estimator)
     for u in remain_nodes:
         assert scores[u] >= 0
+        assert scores[u] == uncert[u]
 
 
 @pytest.mark.parametrize("return_type", ['nodes', 'tuples', 'tree'])
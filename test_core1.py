@@ -1,5 +1,6 @@
 import pytest
-from core1 import matching_trees_cython, matching_trees, prediction_error, query_score
+import numpy as np
+from core1 import matching_trees_cython, matching_trees, prediction_error, query_score, pack_trees
 from scipy.stats import entropy
 
 @pytest.fixture
@@ -40,3 +41,34 @@ def test_query_score(T):
     score = query_score(0, T, [3, 4])
     expected = entropy([1/3, 2/3]) * 2 * 3/4
     assert score == expected
+
+
+def test_pack_trees(T):
+    bits = pack_trees(T, [1, 3, 3, 5])
+    assert bits.shape == (4, 1)
+    assert list(bits[:, 0]) == [0b1111, 0b1100, 0b1100, 0]
+
+
+@pytest.mark.parametrize("n_trees", [32, 100, 150])
+def test_many_trees(n_trees):
+    """trees span several 64-bit words, the last one possibly more than half full"""
+    np.random.seed(1)
+    T = [set(np.nonzero(np.random.rand(20) < 0.5)[0]) for _ in range(n_trees)]
+
+    node_values = {1: 1, 2: 0, 3: 1}
+    expected = [t for t in T if 1 in t and 2 not in t and 3 in t]
+    assert matching_trees(T, node_values) == expected
+    assert matching_trees_cython(T, 2, 0) == [t for t in T if 2 not in t]
+
+    hidden_nodes = list(range(1, 20))
+    sub_T = [t for t in T if 0 in t]
+    p = np.array([sum(1 for t in sub_T if u not in t) for u in hidden_nodes]) / len(sub_T)
+    expected = -(p * np.log(p) + (1-p) * np.log(1-p)).sum()
+    assert prediction_error(0, 1, T, hidden_nodes) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("n_trees", [32, 63, 64, 100])
+def test_last_word_mask(n_trees):
+    T = [{1, 2} for _ in range(n_trees)]
+    assert len(matching_trees_cython(T, 0, 0)) == n_trees
+    assert len(matching_trees(T, {0: 0, 1: 1})) == n_trees
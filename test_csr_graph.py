@@ -0,0 +1,42 @@
+import pytest
+import numpy as np
+from graph_tool import Graph
+
+from fixture import g
+from graph_helpers import extract_edges, get_edge_weights
+from csr_graph import CSRGraph
+
+
+def edge_to_weight(g):
+    weights = get_edge_weights(g)
+    return {(int(e.source()), int(e.target())): weights[e]
+            for e in g.edges()}
+
+
+def test_csr_graph_round_trip(g, tmpdir):
+    path = str(tmpdir.join('graph.csr'))
+    CSRGraph.from_gt(g, get_edge_weights(g)).save(path)
+
+    csr = CSRGraph.load(path)
+    assert isinstance(csr.indices, np.memmap)
+    assert csr.num_vertices() == g.num_vertices()
+    assert csr.num_edges() == g.num_edges()
+
+    for v in range(g.num_vertices()):
+        assert set(csr.out_neighbours(v)) == set(g.get_out_neighbours(v))
+
+    # graph_tool graph built lazily
+    assert csr._gt is None
+    assert edge_to_weight(csr.gt) == pytest.approx(edge_to_weight(g))
+
+
+def test_csr_graph_undirected():
+    g = Graph(directed=False)
+    g.add_vertex(4)
+    g.add_edge_list([(0, 1), (1, 2), (2, 0), (1, 3)])
+
+    csr = CSRGraph.from_gt(g)
+    assert list(csr.out_degree()) == [2, 3, 2, 1]
+    assert csr.num_edges() == 4
+    assert set(map(lambda e: tuple(sorted(e)), extract_edges(csr.gt))) == \
+        {(0, 1), (1, 2), (0, 2), (1, 3)}
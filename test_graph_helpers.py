@@ -1,25 +1,32 @@
 import pytest
+import numpy as np
 from numpy.testing import assert_almost_equal
 from graph_tool import Graph
 from graph_tool.topology import label_components
 from graph_tool.generation import complete_graph, lattice
 from graph_tool.search import bfs_search
+from graph_tool.centrality import pagerank
 from scipy.stats import entropy
 
 from fixture import line, tree
 
 
 from fixture import g, obs
+from csr_graph import CSRGraph
 from graph_helpers import (extract_steiner_tree, filter_graph_by_edges,
                            extract_edges, extract_nodes,
                            remove_filters,
                            contract_graph_by_nodes,
                            isolate_node,
                            hide_disconnected_components,
+                           observe_uninfected_node,
                            k_hop_neighbors,
                            pagerank_scores,
+                           personalized_pagerank,
                            reachable_node_set,
                            get_leaves,
+                           reverse_edge_rows,
+                           visible_mask,
                            BFSNodeCollector, reverse_bfs)
 
 
@@ -122,9 +129,28 @@ def test_isolate_disconnected_components():
 
     hide_disconnected_components(g, [0])
     assert set(extract_nodes(g)) == {0, 1, 2}
-    
 
-def test_k_hop_neighbors():
+
+def test_observe_uninfected_node():
+    """
+    0 -- 1 -- 2 -- 3
+    """
+    g = remove_filters(Graph(directed=False))
+    g.add_vertex(4)
+    g.add_edge_list([(0, 1), (1, 2), (2, 3)])
+
+    observe_uninfected_node(g, 2, [0])
+    # 3 is not reachable from 0 any more,
+    # 2 itself is isolated, so it's hidden as well
+    assert set(extract_nodes(g)) == {0, 1}
+
+    observe_uninfected_node(g, 1, [0])
+    assert set(extract_nodes(g)) == {0}
+    assert list(visible_mask(g)) == [True, False, False, False]
+
+
+@pytest.fixture
+def k_hop_graph():
     """
     0 -- 1
     |    |
@@ -135,15 +161,29 @@ def test_k_hop_neighbors():
     edges = [(0, 1), (0, 2), (1, 3), (2, 3), (3, 4), (4, 5)]
     for u, v in edges:
         g.add_edge(u, v)
+    return g
+
 
-    assert k_hop_neighbors(0, g, k=1) == {1, 2}
-    assert k_hop_neighbors(0, g, k=2) == {1, 2, 3}
-    assert k_hop_neighbors(0, g, k=3) == {1, 2, 3, 4}
+@pytest.mark.parametrize("as_csr", [False, True])
+def test_k_hop_neighbors(k_hop_graph, as_csr):
+    g = k_hop_graph
+    if as_csr:
+        g = CSRGraph.from_gt(g)
+
+    def nbrs(v, k):
+        return set(k_hop_neighbors(v, g, k=k))
+
+    assert nbrs(0, k=1) == {1, 2}
+    assert nbrs(0, k=2) == {1, 2, 3}
+    assert nbrs(0, k=3) == {1, 2, 3, 4}
     for k in (4, 5, 6, 7, 8, 9, 10):
-        assert k_hop_neighbors(0, g, k=k) == {1, 2, 3, 4, 5}
-    
-    assert k_hop_neighbors(3, g, k=1) == {1, 2, 4}
-    assert k_hop_neighbors(3, g, k=2) == {0, 1, 2, 4, 5}
+        assert nbrs(0, k=k) == {1, 2, 3, 4, 5}
+
+    assert nbrs(3, k=1) == {1, 2, 4}
+    assert nbrs(3, k=2) == {0, 1, 2, 4, 5}
+
+    nodes, dists = k_hop_neighbors(3, g, k=2, return_dist=True)
+    assert dict(zip(nodes, dists)) == {1: 1, 2: 1, 4: 1, 0: 2, 5: 2}
 
 
 def test_pagerank_scores(g, obs):
@@ -160,6 +200,19 @@ def test_pagerank_scores(g, obs):
         assert ent1 < ent2
 
 
+def test_personalized_pagerank(g, obs):
+    pers = g.new_vertex_property('float')
+    pers.a[obs] = 1 / len(obs)
+    expected = pagerank(g, pers=pers, epsilon=1e-10).a
+
+    actual = personalized_pagerank(g, pers.a, epsilon=1e-10)
+    assert_almost_equal(actual, expected, decimal=6)
+
+    # warm start from another vector
+    actual = personalized_pagerank(g, pers.a, init=np.ones(g.num_vertices()), epsilon=1e-10)
+    assert_almost_equal(actual, expected, decimal=6)
+
+
 def test_reachable_node_set():
     g = Graph(directed=False)
     g.add_vertex(4)
@@ -168,6 +221,12 @@ def test_reachable_node_set():
     assert actual == {0, 1, 2}
 
 
+def test_reverse_edge_rows():
+    edges = np.array([(0, 1), (1, 0), (1, 3), (3, 1), (0, 2), (2, 2)])
+    actual = reverse_edge_rows(edges, 4)
+    assert list(actual) == [1, 0, 3, 2, -1, 5]
+
+
 @pytest.mark.parametrize('tree, expected',
                          [(tree(), [2, 3]),
                           (line(), [3])])
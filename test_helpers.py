@@ -41,7 +41,7 @@ def check_samples_so_far(g, sampler, estimator, obs_inf, obs_uninf):
             assert v in t, 'should be in sample'
             assert estimator._m[v, :].sum() == estimator.n_col
 
-    assert estimator._m.shape == (g.num_vertices(), sampler.n_samples)
+    assert estimator._m.shape == (g.num_vertices(ignore_filter=True), sampler.n_samples)
     for v in obs_uninf:
         for t in sampler.samples:
             assert isinstance(t, set), 'should be set'
@@ -0,0 +1,58 @@
+import numpy as np
+
+from ingest_edge_list import (
+    read_edge_list,
+    relabel_nodes,
+    clean_edges,
+    largest_component_mask
+)
+
+
+def test_read_edge_list(tmpdir):
+    path = str(tmpdir.join('graph.txt'))
+    with open(path, 'w') as f:
+        f.write('# comment\n'
+                '10 20 0.1\n'
+                '20 20 0.2\n'  # self-loop
+                '10 20 0.3\n'  # duplicate
+                '20 10 0.4\n'
+                '30 10 0.5\n')
+
+    # duplicates across chunks are dropped as well
+    src, tgt, w = read_edge_list(path, chunksize=2, weight_column=2)
+    assert sorted(zip(src, tgt, w)) == [(10, 20, 0.1), (20, 10, 0.4), (30, 10, 0.5)]
+
+    src, tgt, w = read_edge_list(path, chunksize=2)
+    assert w is None
+    assert sorted(zip(src, tgt)) == [(10, 20), (20, 10), (30, 10)]
+
+
+def test_relabel_nodes():
+    src, tgt, labels = relabel_nodes(np.array([100, 7, 42]), np.array([7, 42, 100]))
+    assert list(labels) == [7, 42, 100]
+    assert list(src) == [2, 0, 1]
+    assert list(tgt) == [0, 1, 2]
+
+
+def test_clean_edges():
+    src = np.array([0, 1, 0, 1, 2])
+    tgt = np.array([1, 0, 1, 1, 0])
+    w = np.array([0.1, 0.2, 0.3, 0.4, 0.5])
+
+    s, t, ws = clean_edges(src, tgt, w, 3, directed=True)
+    assert sorted(zip(s, t, ws)) == [(0, 1, 0.1), (1, 0, 0.2), (2, 0, 0.5)]
+
+    # reversed edges are duplicates
+    s, t, ws = clean_edges(src, tgt, w, 3, directed=False)
+    assert sorted(zip(s, t, ws)) == [(0, 1, 0.1), (0, 2, 0.5)]
+
+    s, t, ws = clean_edges(src, tgt, None, 3, directed=True, symmetrize=True)
+    assert ws is None
+    assert sorted(zip(s, t)) == [(0, 1), (0, 2), (1, 0), (2, 0)]
+
+
+def test_largest_component_mask():
+    # components {0, 1, 2} (weakly connected) and {3, 4}
+    src = np.array([0, 2, 3])
+    tgt = np.array([1, 1, 4])
+    assert list(largest_component_mask(src, tgt, 6)) == [True, True, True, False, False, False]
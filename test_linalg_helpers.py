@@ -0,0 +1,27 @@
+import pytest
+import numpy as np
+from graph_tool import Graph
+from graph_tool.generation import lattice
+
+from linalg_helpers import num_spanning_trees_dense, log_num_spanning_trees
+
+
+def test_log_num_spanning_trees_unweighted():
+    g = lattice((3, 3))
+    assert log_num_spanning_trees(g) == pytest.approx(np.log(192))
+    assert log_num_spanning_trees(g) == pytest.approx(np.log(num_spanning_trees_dense(g)))
+
+
+def test_log_num_spanning_trees_weighted():
+    np.random.seed(1)
+    g = lattice((4, 5))
+    w = g.new_edge_property('float')
+    w.a = np.random.random(g.num_edges()) + 0.1
+    assert log_num_spanning_trees(g, w) == pytest.approx(np.log(num_spanning_trees_dense(g, w)))
+
+
+def test_log_num_spanning_trees_disconnected():
+    g = Graph(directed=False)
+    g.add_vertex(5)
+    g.add_edge_list([(0, 1), (1, 2), (3, 4)])
+    assert log_num_spanning_trees(g) == -np.inf
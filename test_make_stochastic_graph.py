@@ -0,0 +1,35 @@
+import pytest
+import numpy as np
+from graph_tool import Graph
+
+from make_stochastic_graph import stochastic_edge_weights
+
+
+@pytest.fixture
+def g():
+    """node 0 has zero in-degree"""
+    g = Graph(directed=True)
+    g.add_vertex(4)
+    g.add_edge_list([(0, 1), (0, 2), (1, 2), (2, 3), (3, 1)])
+    return g
+
+
+def test_stochastic_edge_weights(g):
+    w = stochastic_edge_weights(g)
+    in_deg_weighted = g.degree_property_map('in', weight=w).a
+    assert list(in_deg_weighted) == pytest.approx([0, 1, 1, 1])
+
+    assert w[g.edge(0, 1)] == pytest.approx(0.5)
+    assert w[g.edge(3, 1)] == pytest.approx(0.5)
+    assert w[g.edge(2, 3)] == pytest.approx(1.0)
+
+
+def test_stochastic_edge_weights_reverse():
+    g = Graph(directed=True)
+    g.add_vertex(3)
+    g.add_edge_list([(0, 1), (1, 0), (1, 2), (2, 1)])
+
+    w_rev = stochastic_edge_weights(g, reverse=True)
+    out_deg_weighted = g.degree_property_map('out', weight=w_rev).a
+    assert list(out_deg_weighted) == pytest.approx(np.ones(3))
+    assert w_rev[g.edge(1, 0)] == pytest.approx(0.5)
@@ -0,0 +1,44 @@
+import pytest
+import numpy as np
+
+from math_helpers import (
+    inclusion_proba,
+    systematic_sample,
+    sample_size_for_rel_std
+)
+
+
+def test_inclusion_proba():
+    proba = inclusion_proba([10, 1, 1, 0, 2], 3)
+    assert proba.sum() == pytest.approx(3)
+    assert list(proba) == pytest.approx([1, 0.5, 0.5, 0, 1])
+
+    # fewer items with positive weight than requested
+    assert list(inclusion_proba([1, 0, 2], 5)) == [1, 0, 1]
+
+
+def test_systematic_sample():
+    np.random.seed(123)
+    proba = inclusion_proba(np.random.rand(20), 5)
+    freq = np.zeros(20)
+    n_reps = 5000
+    for _ in range(n_reps):
+        sample = systematic_sample(proba)
+        assert len(sample) == 5
+        assert len(np.unique(sample)) == 5
+        freq[sample] += 1
+    assert freq / n_reps == pytest.approx(proba, abs=0.03)
+
+
+def test_sample_size_for_rel_std():
+    np.random.seed(123)
+    values = np.random.rand(100) ** 4
+    weights = np.ones(100)
+    # sampling proportional to the values needs fewer samples
+    assert (sample_size_for_rel_std(values, values, 0.1)
+            < sample_size_for_rel_std(weights, values, 0.1))
+
+    sizes = [sample_size_for_rel_std(weights, values, s) for s in [0.0, 0.05, 0.1, 0.5]]
+    assert sizes[0] == 100
+    assert sizes == sorted(sizes, reverse=True)
+    assert sample_size_for_rel_std(weights, values, 0.0, max_size=30) == 30
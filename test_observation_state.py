@@ -0,0 +1,39 @@
+import numpy as np
+from graph_tool import Graph
+from graph_tool.topology import label_components
+
+from graph_helpers import remove_filters, isolate_node
+from observation_state import ObservationState
+
+
+def star():
+    g = remove_filters(Graph(directed=True))
+    g.add_vertex(4)
+    g.add_edge_list([(0, 1), (1, 0), (0, 2,), (2, 0), (0, 3), (3, 0)])
+    return g
+
+
+def test_observation_state():
+    g = star()
+    state = ObservationState(g)
+
+    state.observe_uninfected_node(1, [0])
+    assert state.version == 1
+    assert state.is_isolated(1)
+    assert not state.is_isolated(0)
+    assert g.num_edges() == 4
+    assert set(label_components(g, directed=False)[0].a) == {0, 1}
+
+    state.observe_uninfected_node(0, [])
+    assert state.version == 2
+    assert g.num_edges() == 0
+    assert state.uninfected == [1, 0]
+
+
+def test_observation_state_consistent_with_isolate_node():
+    g1, g2 = star(), star()
+    state = ObservationState(g1)
+    for n in (2, 3):
+        state.isolate_node(n)
+        isolate_node(g2, n)
+        assert np.array_equal(state.edge_mask, g2.get_edge_filter()[0].a)
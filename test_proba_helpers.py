@@ -0,0 +1,75 @@
+import pytest
+import numpy as np
+from random_steiner_tree import random_steiner_tree
+
+from fixture import g, gi, obs
+from graph_helpers import get_edge_weights, swap_end_points
+from proba_helpers import (
+    tree_probability_gt,
+    cascade_probability_gt,
+    ic_cascade_probability_gt,
+    LogProbaTables,
+    TreeFreqEstimator,
+    segment_sum,
+    tree_fingerprints,
+    distribution_distances
+)
+
+
+def test_segment_sum():
+    values = np.array([1., 2., 3., 4.])
+    assert list(segment_sum(values, [1, 0, 3, 0])) == [1., 0., 9., 0.]
+    assert list(segment_sum(np.zeros(0), [0, 0])) == [0., 0.]
+
+
+def test_log_proba_tables(g, gi, obs):
+    p = get_edge_weights(g)
+    p_dict = {(int(e.source()), int(e.target())): p[e] for e in g.edges()}
+    nbr_dict = {}
+    for u, v in p_dict:
+        nbr_dict.setdefault(u, []).append(v)
+    out_degree = g.degree_property_map('out', weight=p)
+    out_degree_dict = {int(v): out_degree[v] for v in g.vertices()}
+
+    trees = [swap_end_points(random_steiner_tree(gi, obs, obs[0], method='loop_erased'))
+             for _ in range(10)]
+    trees.append(tuple())
+
+    tables = LogProbaTables(g, p)
+    rows, lengths = tables.batch_rows(trees)
+    assert list(lengths) == list(map(len, trees))
+
+    expected = [ic_cascade_probability_gt(g, p_dict, t, nbr_dict) for t in trees]
+    assert tables.ic_cascade_log_proba(rows, lengths) == pytest.approx(expected)
+
+    expected = [cascade_probability_gt(g, p_dict, t, nbr_dict) for t in trees]
+    assert tables.cascade_log_proba(rows, lengths) == pytest.approx(expected)
+
+    expected = [tree_probability_gt(out_degree_dict, p_dict, t) for t in trees]
+    assert tables.tree_log_proba(rows, lengths) == pytest.approx(expected)
+
+
+def test_tree_freq_estimator():
+    trees = [((0, 1), (1, 2)), ((1, 2), (0, 1)), ((0, 2), ), ((0, 1), (1, 2)), tuple()]
+
+    estimator = TreeFreqEstimator(3)
+    estimator.add(trees[:2])
+    estimator.add(trees[2:])
+    # edge order does not matter
+    assert estimator.n_samples == 5
+    assert estimator.support_size == 3
+    assert sorted(estimator.counts) == [1, 1, 3]
+
+    fps = tree_fingerprints([((0, 1), (1, 2)), ((1, 0), )], 3)
+    assert list(estimator.probas(fps)) == [0.6, 0.0]
+
+    # heavy hitters only
+    estimator = TreeFreqEstimator(3, capacity=1)
+    estimator.add(trees)
+    assert estimator.support_size == 1
+    assert set(estimator.tree(estimator.fingerprints[0])) == {(0, 1), (1, 2)}
+
+    dists = distribution_distances([0.5, 0.5, 0.], [0., 0.5, 0.5])
+    assert dists['l1_dist'] == pytest.approx(1.0)
+    assert dists['cosine_sim'] == pytest.approx(0.5)
+    assert dists['hellinger_dist'] == pytest.approx(np.sqrt(0.5))
@@ -1,5 +1,6 @@
 import pytest
 import numpy as np
+from numpy.testing import assert_almost_equal
 from query_selection import (
     RandomQueryGenerator,
     EntropyQueryGenerator,
@@ -8,7 +9,8 @@ from query_selection import (
     MutualInformationQueryGenerator,
     SamplingBasedGenerator,
     LatestFirstOracle,
-    EarliestFirstOracle
+    EarliestFirstOracle,
+    NoMoreQuery
 )
 from simulator import Simulator
 from graph_helpers import remove_filters, get_edge_weights
@@ -230,5 +232,155 @@ def test_cond_entropy_sample_nodes_for_estimation(g):
         )
         sim.run(0, force_receive_obs=True)
 
-        samples = q_gen._sample_nodes_for_estimation()
-        assert len(samples) == n_node_samples
+        samples, weights = q_gen._sample_nodes_for_estimation()
+        # without replacement, nodes with infection probability 0 or 1 are not sampled
+        assert len(samples) <= n_node_samples
+        assert len(set(samples)) == len(samples)
+        assert set(samples) <= set(q_gen._cand_pool)
+        assert len(weights) == len(samples)
+        assert (weights >= 1).all()
+
+
+def test_cond_entropy_adaptive_node_samples(g):
+    sizes = []
+    for rel_std in [0.01, 0.1, 0.5]:
+        np.random.seed(1)
+        sim, q_gen = build_simulator_using_cond_entropy_query_selector(
+            g, node_sample_rel_std=rel_std
+        )
+        sim.run(0, force_receive_obs=True)
+        samples, weights = q_gen._sample_nodes_for_estimation()
+        sizes.append(len(samples))
+
+        q = q_gen.select_query(sim.g, None)
+        assert np.isfinite(q_gen.query_scores[q])
+
+    # fewer estimation nodes for larger error
+    assert sizes == sorted(sizes, reverse=True)
+
+
+@pytest.mark.parametrize("query_method", ['random', 'pagerank', 'pagerank-incremental',
+                                          'cond_entropy', 'mutual-info'])
+@pytest.mark.parametrize("batch_size", [1, 3])
+def test_batch_query(g, query_method, batch_size):
+    gv = remove_filters(g)
+    gi = from_gt(g, get_edge_weights(gv))
+    if query_method == 'random':
+        q_gen = RandomQueryGenerator(gv)
+    elif query_method == 'pagerank':
+        q_gen = PRQueryGenerator(gv)
+    elif query_method == 'pagerank-incremental':
+        q_gen = PRQueryGenerator(gv, incremental=True)
+    else:
+        cls = {'cond_entropy': CondEntropyQueryGenerator,
+               'mutual-info': MutualInformationQueryGenerator}[query_method]
+        pool = TreeSamplePool(gv, n_samples=20, method='loop_erased',
+                              gi=gi, return_type='nodes')
+        q_gen = cls(gv, pool,
+                    error_estimator=TreeBasedStatistics(gv),
+                    root_sampler='true_root')
+
+    sim = Simulator(gv, q_gen, gi=gi, print_log=True)
+    n_queries = 10
+    qs, aux = sim.run(n_queries,
+                      gen_input_kwargs={'min_fraction': 20. / gv.num_vertices()},
+                      iter_callback=iter_callback,
+                      batch_size=batch_size)
+
+    assert len(qs) == n_queries
+    assert len(set(qs)) == n_queries
+    assert set(qs).intersection(set(aux['obs'])) == set()
+
+    if query_method == 'cond_entropy':
+        check_tree_samples(qs, aux['c'], q_gen.sampler.samples)
+
+
+def test_batch_query_short_batches(g):
+    class OneAtATime(RandomQueryGenerator):
+        def select_queries(self, g, inf_nodes, k):
+            return super().select_queries(g, inf_nodes, 1)
+
+    gv = remove_filters(g)
+    gi = from_gt(g, get_edge_weights(gv))
+    sim = Simulator(gv, OneAtATime(gv), gi=gi)
+    qs, aux = sim.run(5,
+                      gen_input_kwargs={'min_fraction': 20. / gv.num_vertices()},
+                      batch_size=3)
+
+    # keeps going until enough queries are made
+    assert len(qs) == 5
+    assert len(set(qs)) == 5
+
+
+@pytest.mark.parametrize("max_elements", [1, 50, 2**20])
+def test_query_scores_vs_query_score(g, max_elements):
+    gv = remove_filters(g)
+    pool = TreeSamplePool(gv, n_samples=20, method='loop_erased',
+                          gi=from_gt(g, get_edge_weights(gv)),
+                          return_type='nodes')
+    obs = [0, 45, 99]
+    pool.fill(obs)
+    stat = TreeBasedStatistics(gv, pool.samples)
+
+    queries = np.setdiff1d(np.arange(0, 100, 7), obs)
+    targets = np.arange(1, 100, 3)
+    weights = np.random.random(len(targets))
+    actual = stat.query_scores(queries, targets, node_weights=weights,
+                               max_elements=max_elements)
+    for i, q in enumerate(queries):
+        keep = targets != q
+        assert_almost_equal(actual[i],
+                            stat.query_score(q, targets[keep], node_weights=weights[keep]))
+
+
+def test_cond_entropy_branch_and_bound(g):
+    np.random.seed(1)
+    sim, q_gen = build_simulator_using_cond_entropy_query_selector(g)
+    sim.run(0, force_receive_obs=True)
+    q = q_gen._select_query(sim.g, None)
+    exact_score = q_gen.query_scores[q]
+
+    q_gen.branch_and_bound = True
+    q_bb = q_gen._select_query(sim.g, None)
+    assert_almost_equal(q_gen.query_scores[q_bb], exact_score)
+    assert q_gen.n_evaluated <= len(q_gen._cand_pool)
+
+
+def test_cond_entropy_lazy(g):
+    np.random.seed(1)
+    sim, q_gen = build_simulator_using_cond_entropy_query_selector(g, lazy=True)
+    n_queries = 5
+    qs, aux = sim.run(n_queries,
+                      gen_input_kwargs={'min_fraction': 20. / g.num_vertices()})
+
+    assert len(qs) == n_queries
+    assert len(q_gen.n_saved) == n_queries
+    # every score is computed in the first round
+    assert q_gen.n_saved[0] == 0
+    assert set(q_gen.query_scores) == set(q_gen._cand_pool) | {qs[-1]}
+
+
+@pytest.mark.parametrize("oracle_cls, key", [
+    (LatestFirstOracle, lambda t: -t),
+    (EarliestFirstOracle, lambda t: t)
+])
+def test_oracle_order(g, oracle_cls, key):
+    n = g.num_vertices()
+    np.random.seed(1)
+    c = np.random.randint(-1, 10, n)
+    obs = np.nonzero(c >= 0)[0][:2]
+
+    q_gen = oracle_cls(g, obs, c)
+    removed = np.nonzero(c >= 0)[0][2]
+    q_gen._cand_pool.remove(removed)
+
+    qs = []
+    while True:
+        try:
+            qs.append(q_gen.select_query(g, obs))
+        except NoMoreQuery:
+            break
+
+    expected = set(np.nonzero(c >= 0)[0]) - set(obs) - {removed}
+    assert set(qs) == expected
+    assert [key(c[q]) for q in qs] == sorted(key(c[q]) for q in qs)
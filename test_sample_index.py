@@ -0,0 +1,31 @@
+import numpy as np
+
+from sample_index import SampleIndex
+
+
+def matching(samples, node_values):
+    return [all((n in s) == (v == 1) for n, v in node_values.items())
+            for s in samples]
+
+
+def test_sample_index():
+    np.random.seed(1)
+    n_nodes, n_samples = 20, 100  # samples span two words
+    samples = [set(np.nonzero(np.random.rand(n_nodes) < 0.5)[0]) for _ in range(n_samples)]
+
+    index = SampleIndex(n_nodes, n_samples)
+    index.build(samples)
+
+    for node_values in [{}, {1: 1}, {1: 1, 2: 0}, {3: 0, 4: 0, 5: 1}]:
+        assert list(index.matching(node_values)) == matching(samples, node_values)
+
+    # replace the invalid samples
+    node_values = {1: 1, 2: 0}
+    slots = np.nonzero(~index.matching(node_values))[0]
+    index.remove(slots, [samples[i] for i in slots])
+    for i in slots:
+        samples[i] = {1, 3}
+    index.add(slots, [samples[i] for i in slots])
+
+    assert index.matching(node_values).all()
+    assert list(index.matching({3: 1})) == matching(samples, {3: 1})
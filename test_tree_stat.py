@@ -115,6 +115,26 @@ sum 5 1 1 3 2 0
                  arr_c1)
 
 
+def test_update_trees_with_invalidated_mask(stat, new_trees):
+    expected = TreeBasedStatistics(stat._g, [{2, 5}, {0, 3}, {0, 3, 4}, {3, 4, 5}, {0, 2, 3}])
+    expected.update_trees(new_trees, {0: 1})
+
+    # trees 0 and 3 do not have node 0
+    stat.update_trees(new_trees, {0: 1},
+                      invalidated=np.array([True, False, False, True, False]))
+    assert_eq_np(stat._m, expected._m)
+
+
+def test_pop_changed_nodes(stat, new_trees):
+    stat.track_changes = True
+    assert set(stat.pop_changed_nodes()) == set(range(6))
+    assert set(stat.pop_changed_nodes()) == set()
+
+    # trees {2, 5} and {3, 4, 5} are replaced by {0, 1} and {0, 4}
+    stat.update_trees(new_trees, {0: 1})
+    assert set(stat.pop_changed_nodes()) == {0, 1, 2, 3, 5}
+
+
 def test_update_trees_multiple_nodes_update(stat, new_trees):
     """
     1 1 0 0 0 0 (new*)
@@ -171,3 +191,71 @@ def test_query_score(stat1):
     actual = stat1.query_score(0, [3, 4])
     expected = entropy([1/3, 2/3]) * 2 * 3/4  # + error = 0 for state=1
     assert_almost_equal(actual, expected)
+
+
+def test_batch_query_score(stat1):
+    assert_almost_equal(stat1.batch_query_score([0], [3, 4]),
+                        stat1.query_score(0, [3, 4]))
+    # node 4 is uncertain only in trees having node 3
+    assert_almost_equal(stat1.batch_query_score([0, 3], [4]),
+                        entropy([1/2, 1/2]) * 2/4)
+
+
+def test_query_scores(stat):
+    targets = np.arange(6)
+    weights = np.arange(1., 7.)
+    actual = stat.query_scores([0, 2, 5], targets, node_weights=weights)
+    for i, q in enumerate([0, 2, 5]):
+        others = np.array(list(set(targets) - {q}))
+        assert_almost_equal(actual[i],
+                            stat.query_score(q, others, node_weights=weights[others]))
+
+    assert_almost_equal(stat.query_scores([0, 2, 5], [3, 4], max_elements=4),
+                        [stat.query_score(q, [3, 4]) for q in [0, 2, 5]])
+
+
+def test_query_score_lower_bound(stat):
+    targets = np.arange(6)
+    bounds = stat.query_score_lower_bound(targets, targets)
+    for q in [0, 2, 3, 4, 5]:  # node 1 is in no tree, so its score is undefined
+        assert bounds[q] <= stat.query_score(q, list(set(targets) - {q})) + 1e-10
+
+    # node 1 tells nothing about the others
+    assert_almost_equal(bounds[1], stat.node_level_entropy(targets).sum())
+
+    weights = np.arange(1., 7.)
+    bounds = stat.query_score_lower_bound(targets, targets, node_weights=weights)
+    for q in [0, 2, 3, 4, 5]:
+        others = np.array(list(set(targets) - {q}))
+        assert bounds[q] <= stat.query_score(q, others, node_weights=weights[others]) + 1e-10
+
+
+def test_set_active_subgraph(g, trees):
+    """only nodes 0, 2, 3 are active, the trees contain no other nodes
+    """
+    trees = [t - {4, 5} for t in trees]
+    stat = TreeBasedStatistics(g, trees)
+    expected = stat.unconditional_count()
+
+    n2o = np.array([0, 2, 3])
+    o2n = np.array([0, -1, 1, 2, -1, -1])
+    active = type('ActiveSubgraph', (), {'n2o': n2o, 'o2n': o2n})
+    stat.set_active_subgraph(active)
+
+    assert stat._m.shape == (3, len(trees))
+    assert_eq_np(stat.unconditional_count(), expected)
+    assert_eq_np(stat.unconditional_count([3, 1, 0]), expected[[3, 1, 0]])
+    assert_eq_np(stat.count(0, 1, [2, 3]), [1, 3])
+    assert set(stat.filter_out_extreme_targets()) == {0, 2, 3}
+
+    # nodes outside of the subgraph (1 and 4) are in no tree
+    assert_eq_np(stat.count(0, 1, [1, 4]), [0, 0])
+    assert_eq_np(stat.count(4, 0, [2, 3]), expected[[2, 3]])
+    # node 4 tells nothing about the others
+    assert_almost_equal(stat.batch_query_score([4], [2, 3]), stat.node_level_entropy([2, 3]).sum())
+    assert_almost_equal(stat.query_scores([4, 0], [2, 3, 1]),
+                        [stat.query_score(4, [2, 3, 1]), stat.query_score(0, [2, 3, 1])])
+
+    stat.build_matrix(trees)
+    assert stat._m.shape == (3, len(trees))
+    assert_eq_np(stat.unconditional_count(), expected)
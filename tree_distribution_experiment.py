@@ -1,29 +1,30 @@
 # coding: utf-8
 
-import networkx as nx
 import numpy as np
-import pandas as pd
-import pickle as pkl
 import random
 
-from scipy.spatial.distance import cosine, cdist
-from tqdm import tqdm
 from itertools import combinations
-from joblib import Parallel, delayed
-from graph_tool import openmp_set_num_threads
+from collections import OrderedDict
 
 from random_steiner_tree.util import from_nx
 
-from proba_helpers import sampled_tree_freqs, tree_probability_nx as tree_probability
+from distribution_sweep import sweep, add_sweep_args, KEY_COLUMNS
+
+from proba_helpers import (
+    streaming_tree_freqs,
+    union_support,
+    distribution_distances,
+    tree_probability_nx as tree_probability
+)
 
 
 HIGH = 1
 LOW = 0.0
+METRICS = ('cosine_sim', 'l1_dist', 'hellinger_dist')
 
 
-def one_run(num_vertices, size_X, n_samples, low=LOW, high=HIGH):
-    g = nx.complete_graph(num_vertices, create_using=nx.DiGraph())
-    
+def one_run(g, size_X, n_samples, low=LOW, high=HIGH):
+    """g: complete nx.DiGraph, whose edge weights are re-drawn"""
     for u, v in g.edges_iter():
         g[u][v]['weight'] = (high - low) * np.random.random() + low
 
@@ -41,50 +42,38 @@ def one_run(num_vertices, size_X, n_samples, low=LOW, high=HIGH):
     # print('terminals = {}'.format(X))
     # print(g[X[0]][root]['weight'])
 
-    lerw_tree_freq = sampled_tree_freqs(gi, X, root, 'loop_erased', n_samples)
+    n = g.number_of_nodes()
+    lerw_tree_freq = streaming_tree_freqs(gi, X, root, 'loop_erased', n_samples, n)
+
+    cut_tree_freq = streaming_tree_freqs(gi, X, root, 'cut', n_samples, n)
 
-    cut_tree_freq = sampled_tree_freqs(gi, X, root, 'cut', n_samples)
-    
-    all_trees = set(lerw_tree_freq.keys()) | set(cut_tree_freq.keys())
+    all_trees, tree_reprs = union_support(lerw_tree_freq, cut_tree_freq)
     # print("num. unique trees: {}".format(len(all_trees)))
 
-    lerw_actual_probas = np.array([lerw_tree_freq[t] / n_samples for t in all_trees])
-    cut_actual_probas = np.array([cut_tree_freq[t] / n_samples for t in all_trees])
+    lerw_actual_probas = lerw_tree_freq.probas(all_trees)
+    cut_actual_probas = cut_tree_freq.probas(all_trees)
 
     expected_probas = np.array([tree_probability(g, t)
-                                for t in all_trees])
+                                for t in tree_reprs])
     expected_probas /= expected_probas.sum()
 
     name_and_probas = [('True', expected_probas),
                        ('lerw', lerw_actual_probas),
                        ('cut', cut_actual_probas)]
 
-    cosine_sims = {}
-    abs_dists = {}
+    ans = OrderedDict()
     for (n1, p1), (n2, p2) in combinations(name_and_probas, 2):
-        # print('sim({}, {})={}'.format(n1, n2, 1-cosine(p1, p2)))
-        cosine_sims[(n1, n2)] = 1-cosine(p1, p2)
-        abs_dists[(n1, n2)] = cdist([p1], [p2], 'minkowski', p=1.0)[0, 0]
-    return cosine_sims, abs_dists
+        dists = distribution_distances(p1, p2)
+        # print('sim({}, {})={}'.format(n1, n2, dists['cosine_sim']))
+        for metric in METRICS:
+            ans['{}:{}-{}'.format(metric, n1, n2)] = dists[metric]
+    return ans
 
 
 if __name__ == '__main__':
     import argparse
     parser = argparse.ArgumentParser(description='')
-    parser.add_argument('-n', '--num_vertices',
-                        type=int,
-                        help='num of vertices of the complete graph')
-    parser.add_argument('-x', '--num_terminals',
-                        type=int, default=2,
-                        help='num  of terminals of the complete graph')
-    parser.add_argument('-k', '--n_samples',
-                        type=int, default=10000000,
-                        help='num  of steiner tree samples')
-    parser.add_argument('-r', '--n_runs',
-                        type=int, default=48,
-                        help='num of runs')
-    parser.add_argument('-o', '--output',
-                        help='output path')
+    add_sweep_args(parser)
 
     args = parser.parse_args()
 
@@ -93,27 +82,13 @@ if __name__ == '__main__':
     for k, v in args._get_kwargs():
         print("{}={}".format(k, v))
 
-    num_vertices = args.num_vertices
-    size_x = args.num_terminals
-    n_samples = args.n_samples
-    n_runs = args.n_runs
-
-    openmp_set_num_threads(1)
-    
-    records = Parallel(n_jobs=4)(
-        delayed(one_run)(num_vertices, size_x, n_samples=n_samples, low=LOW, high=HIGH)
-        for i in tqdm(range(n_runs), total=n_runs))
-    cosine_records, abs_records = zip(*records)
-
-    cosine_df = pd.DataFrame.from_records(filter(None, cosine_records))
-    abs_df = pd.DataFrame.from_records(filter(None, abs_records))
-    
-    data = {
-        'cosine_sim': cosine_df.describe(),
-        'l1_dist': abs_df.describe()
-    }
-    for k, d in data.items():
-        print(k)
-        print(d)
-    pkl.dump(data, open(args.output, 'wb'))
-    
+    df = sweep(one_run, args.num_vertices, args.num_terminals, args.n_samples,
+               args.n_runs, args.output,
+               n_jobs=args.n_jobs, base_seed=args.seed,
+               low=LOW, high=HIGH)
+
+    for metric in METRICS:
+        print(metric)
+        print(df.groupby(KEY_COLUMNS[:-1])[
+            [c for c in df.columns if c.startswith(metric + ':')]
+        ].describe())
@@ -7,35 +7,106 @@ EPS = 1e-15
 class TreeBasedStatistics:
     def __init__(self, g, trees=None):
         self._g = g
-        self.n_row = g.num_vertices()
+        self.n_row = g.num_vertices(ignore_filter=True)  # hidden nodes included
         self.n_col = None
         self._m = None
 
+        # if set, only nodes in the active subgraph have a row
+        self._n2o = None
+        self._o2n = None
+
+        # rows that changed since the last `pop_changed_nodes`,
+        # tracked by `update_trees` only if `track_changes` is on
+        self.track_changes = False
+        self._changed = None
+
         if trees is not None:
             self.build_matrix(trees)
 
+    def set_active_subgraph(self, active_subgraph):
+        """keep only the rows of nodes in `active_subgraph` (an `ActiveSubgraph`),
+
+        the methods still take and return original node ids,
+        nodes outside of it are considered to be in no tree
+        """
+        if self._m is not None:
+            self._m = self._m[self._rows(active_subgraph.n2o), :]
+            self._changed = self._changed[self._rows(active_subgraph.n2o)]
+        self._n2o, self._o2n = active_subgraph.n2o, active_subgraph.o2n
+        self.n_row = len(self._n2o)
+
+    def _rows(self, nodes):
+        """node ids to row indices"""
+        if self._o2n is None:
+            return nodes
+        return self._o2n[nodes]
+
+    def _occurrence(self, nodes):
+        """rows of the occurrence matrix of `nodes` (an int or an array of ints),
+        nodes outside of the active subgraph are in no tree
+        """
+        rows = self._rows(nodes)
+        if np.ndim(rows) == 0:
+            if rows < 0:
+                return np.zeros(self.n_col, dtype=np.bool)
+            return self._m[rows, :]
+        m = self._m[rows, :]  # a copy
+        m[rows < 0, :] = False
+        return m
+
+    def _set_column(self, i, t):
+        rows = self._rows(np.fromiter(t, dtype=np.int64, count=len(t)))
+        self._m[rows[rows >= 0], i] = True  # nodes outside of the active subgraph are dropped
+
     def build_matrix(self, trees):
         """trees: list of set of ints
         """
-        self.n_row = self._g.num_vertices()
+        if self._n2o is None:
+            self.n_row = self._g.num_vertices(ignore_filter=True)
         self.n_col = len(trees)
         self._m = np.zeros((self.n_row, self.n_col), dtype=np.bool)
         for i, t in enumerate(trees):
-            for v in t:
-                self._m[v, i] = True
+            self._set_column(i, t)
+        self._changed = np.ones(self.n_row, dtype=np.bool)
 
-    def update_trees(self, trees, node_info):
-        invalid_tree_indices = set()
-        for n, v in node_info.items():
-            invalid_tree_indices |= set((self._m[n, :] != v).nonzero()[0])
+    def update_trees(self, trees, node_info, invalidated=None):
+        """replace trees that disagree with `node_info` (dict of node -> label) by `trees`,
+        in increasing order of column
+
+        invalidated: boolean array over columns, the trees to replace,
+            if the caller knows them already (e.g., `TreeSamplePool.invalidated`,
+            whose sample positions are the columns)
+        """
+        if invalidated is None:
+            invalid_tree_indices = set()
+            for n, v in node_info.items():
+                invalid_tree_indices |= set((self._occurrence(n) != v).nonzero()[0])
+        else:
+            invalid_tree_indices = set(np.nonzero(invalidated)[0])
 
         assert len(invalid_tree_indices) <= len(trees), \
             "need enough trees to update ({} vs {})".format(len(invalid_tree_indices), len(trees))
         # print('invalid_tree_indices', invalid_tree_indices)
-        for i, t in zip(invalid_tree_indices, trees):
+        replaced = sorted(invalid_tree_indices)
+        if self.track_changes:
+            old_columns = self._m[:, replaced]
+        for i, t in zip(replaced, trees):
             self._m[:, i] = False
-            for v in t:
-                self._m[v, i] = True
+            self._set_column(i, t)
+        if self.track_changes:
+            self._changed |= (old_columns != self._m[:, replaced]).any(axis=1)
+
+    def pop_changed_nodes(self):
+        """nodes whose occurrence in trees changed since last call (all nodes after `build_matrix`)
+
+        requires `track_changes` to be on
+        """
+        assert self.track_changes, 'changes are not tracked'
+        rows = np.nonzero(self._changed)[0]
+        self._changed[:] = False
+        if self._n2o is None:
+            return rows
+        return self._n2o[rows]
 
     def count(self, query, condition, targets, return_denum=False):
         """
@@ -46,13 +117,15 @@ class TreeBasedStatistics:
         2. optionally, |{tree that satisfy tree[query]==condition}| is returned if `return_denum` is True
 
         """
-        mask = (self._m[query, :] == condition).nonzero()[0]
+        mask = (self._occurrence(query) == condition).nonzero()[0]
         # print('mask', mask)
         # print('np.asarray(targets)[:, None]', np.array(list(targets))[:, None])
         try:
-            sub_m = self._m[np.asarray(list(targets))[:, None], mask]
+            rows = self._rows(np.asarray(list(targets)))
+            sub_m = self._m[rows[:, None], mask]
         except IndexError as exc:
             raise IndexError("targets have value: {}".format(list(targets))) from exc
+        sub_m[rows < 0, :] = False  # outside of the active subgraph
 
         if not return_denum:
             return sub_m.sum(axis=1)
@@ -62,10 +135,19 @@ class TreeBasedStatistics:
     def unconditional_count(self, targets=None):
         assert self._m is not None, 'occurence matrix not initialized yet'
         if targets is None:
-            sub_m = self._m
+            if self._n2o is None:
+                return self._m.sum(axis=1)
+            else:
+                # back to all nodes
+                cnt = np.zeros(len(self._o2n), dtype=np.int64)
+                cnt[self._n2o] = self._m.sum(axis=1)
+                return cnt
         else:
-            sub_m = self._m[np.asarray(list(targets)), :]
-        return sub_m.sum(axis=1)
+            rows = self._rows(np.asarray(list(targets)))
+            cnt = self._m[rows, :].sum(axis=1)
+            if self._o2n is not None:
+                cnt[rows < 0] = 0
+            return cnt
 
     def unconditional_proba(self, targets=None):
         return self.unconditional_count(targets) / self.n_col
@@ -81,7 +163,7 @@ class TreeBasedStatistics:
         where p is the unconditional probability
         """
         if targets is None:
-            targets = np.arange(self.n_row)
+            targets = (np.arange(self.n_row) if self._n2o is None else self._n2o)
         proba1 = self.unconditional_proba(targets)
         proba0 = 1 - proba1
         min_proba = np.minimum(proba0, proba1)
@@ -120,7 +202,7 @@ class TreeBasedStatistics:
 
         if node_weights is None:
             node_weights = np.ones(p0.shape)  # equal weight
-        elif node_weights == 'uncond_proba':
+        elif isinstance(node_weights, str) and node_weights == 'uncond_proba':
             # can be cached for each query selection
             node_weights = self.unconditional_proba(targets)
 
@@ -148,6 +230,98 @@ class TreeBasedStatistics:
                 'errors': errors
             }
 
+    def batch_query_score(self, queries, targets, node_weights=None):
+        """
+        condition entropy on target nodes given the joint outcome of `queries`,
+
+        trees are grouped by the infection pattern of `queries`,
+        with a single query, it's the same as `query_score`
+        """
+        pattern = self._occurrence(np.asarray(list(queries)))
+        _, group, group_size = np.unique(pattern.T, axis=0,
+                                         return_inverse=True, return_counts=True)
+        group = group.ravel()
+
+        member = np.zeros((self.n_col, len(group_size)))
+        member[np.arange(self.n_col), group] = 1
+        # |targets| x |groups|
+        num = self._occurrence(np.asarray(list(targets))).astype(np.float64) @ member
+        p = self._smooth_extreme_vals(num / group_size)
+
+        if node_weights is None:
+            node_weights = np.ones(p.shape[0])  # equal weight
+        elif isinstance(node_weights, str) and node_weights == 'uncond_proba':
+            node_weights = self.unconditional_proba(targets)
+
+        ents = -(p * np.log(p) + (1-p) * np.log(1-p))
+        return (node_weights @ ents @ group_size) / self.n_col
+
+    def query_scores(self, queries, targets, node_weights=None, max_elements=2**20):
+        """
+        `query_score(q, targets - {q}, node_weights)` for each q in `queries`,
+
+        computed by matrix products, on chunks of queries
+        so that each |chunk| x |targets| temporary has at most `max_elements` entries
+
+        node_weights: array aligned with `targets` (equal weight if None)
+        """
+        queries = np.asarray(list(queries))
+        targets = np.asarray(list(targets))
+        if node_weights is None:
+            node_weights = np.ones(len(targets))  # equal weight
+
+        m_t = self._occurrence(targets).astype(np.float64)
+        cnt_t = m_t.sum(axis=1)
+
+        chunk_size = max(1, max_elements // max(1, len(targets)))
+
+        scores = np.empty(len(queries))
+        for start in range(0, len(queries), chunk_size):
+            qs = queries[start:start + chunk_size]
+            m_q = self._occurrence(qs).astype(np.float64)
+            # |qs| x |targets|
+            num1 = m_q @ m_t.T
+            num0 = cnt_t - num1
+            denum1 = m_q.sum(axis=1)[:, None]
+            denum0 = self.n_col - denum1
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                p0, p1 = (self._smooth_extreme_vals(num0 / denum0),
+                          self._smooth_extreme_vals(num1 / denum1))
+                ents = (denum0 * -(p0 * np.log(p0) + (1-p0) * np.log(1-p0))
+                        + denum1 * -(p1 * np.log(p1) + (1-p1) * np.log(1-p1))) / self.n_col
+            # q itself is not a target
+            ents[qs[:, None] == targets[None, :]] = 0
+            scores[start:start + chunk_size] = ents @ node_weights
+        return scores
+
+    def query_score_lower_bound(self, queries, targets, node_weights=None):
+        """
+        lower bound of `query_score(q, targets, node_weights)` for each q in `queries`,
+        using unconditional probabilities only:
+
+        H(t | q) >= H(t) - I(t; q) >= H(t) - H(q), and H(t | q) >= 0
+
+        so nodes that are almost surely infected/uninfected get a large bound
+
+        targets: unique nodes
+        node_weights: non-negative array aligned with `targets` (equal weight if None)
+        """
+        h_q = self.node_level_entropy(queries)
+        h_t = self.node_level_entropy(targets)
+        if node_weights is None:
+            node_weights = np.ones(len(h_t))
+        order = np.argsort(h_t)
+        h_t, w_t = h_t[order], np.asarray(node_weights, dtype=np.float64)[order]
+
+        def suffix_sum(a):
+            # suffix_sum(a)[i] = a[i:].sum()
+            return np.append(np.cumsum(a[::-1])[::-1], 0)
+
+        pos = np.searchsorted(h_t, h_q, side='right')
+        # q itself (if in targets) contributes max(0, H(q) - H(q)) = 0
+        return suffix_sum(w_t * h_t)[pos] - suffix_sum(w_t)[pos] * h_q
+
     @property
     def is_matrix_initialized(self):
         return self._m is not None